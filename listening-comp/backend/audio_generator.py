@@ -1,27 +1,36 @@
+import hashlib
 import json
 import os
 import subprocess
+import threading
 from typing import Dict, List
-import boto3
 from tempfile import NamedTemporaryFile
 import logging
+from backend.aws_clients import get_client
 from backend.config import AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_DEFAULT_REGION
 
 class AudioGenerator:
     def __init__(self):
         """Initialize the audio generator with Polly client"""
         try:
-            # Configure AWS session with credentials from config
-            session = boto3.Session(
+            # Shared Polly client using the credentials from config
+            self.polly = get_client(
+                'polly',
+                region_name=AWS_DEFAULT_REGION,
                 aws_access_key_id=AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-                region_name=AWS_DEFAULT_REGION
+                aws_secret_access_key=AWS_SECRET_ACCESS_KEY
             )
             
-            self.polly = session.client('polly')
-            
             # Define Italian voice
             self.voice_id = 'Bianca'  # Standard Italian female voice
+            self.engine = 'standard'  # Use standard engine for better compatibility
+            self.output_format = 'mp3'
+            self.language_code = 'it-IT'
+            
+            # Synthesized audio served from disk instead of calling Polly again
+            self.cache_hits = 0
+            self.cache_misses = 0
+            self._stats_lock = threading.Lock()
             
             # Create audio output directory
             self.audio_dir = os.path.join(os.path.dirname(__file__), 'data', 'audio')
@@ -31,19 +40,24 @@ class AudioGenerator:
             logging.error(f"Failed to initialize AWS clients: {str(e)}")
             raise
 
+    def audio_cache_key(self, text: str) -> str:
+        """Hash of the text and every Polly setting that changes the audio"""
+        settings = [text, self.voice_id, self.engine, self.output_format, self.language_code]
+        return hashlib.sha256(json.dumps(settings, ensure_ascii=False).encode('utf-8')).hexdigest()
+
     def _generate_audio(self, text: str) -> str:
         """Generate audio using Amazon Polly"""
         try:
             response = self.polly.synthesize_speech(
                 Text=text,
-                OutputFormat='mp3',
+                OutputFormat=self.output_format,
                 VoiceId=self.voice_id,
-                LanguageCode='it-IT',
-                Engine='standard'  # Use standard engine for better compatibility
+                LanguageCode=self.language_code,
+                Engine=self.engine
             )
             
-            # Save audio to temporary file
-            with NamedTemporaryFile(suffix='.mp3', delete=False) as f:
+            # Save audio to a temporary file next to the cache, so it can be renamed into place
+            with NamedTemporaryFile(dir=self.audio_dir, suffix='.tmp', delete=False) as f:
                 f.write(response['AudioStream'].read())
                 return f.name
                 
@@ -52,18 +66,47 @@ class AudioGenerator:
             raise
 
     def generate_question_audio(self, question: Dict) -> str:
-        """Generate audio for a question"""
+        """
+        Get the audio file for a question, synthesizing it only if it is not cached.
+        
+        Files are named after a hash of the question text and voice settings, so
+        replays are served from disk without calling Polly, and audio is only
+        regenerated when the text changes.
+        
+        Args:
+            question (Dict): Question with a 'question' text
+            
+        Returns:
+            str: Path of the mp3 file
+        """
         try:
-            # For all questions, use a simple format
-            output_file = os.path.join(self.audio_dir, f"question_{question['id']}.mp3")
+            text = question['question']
+            output_file = os.path.join(self.audio_dir, f"{self.audio_cache_key(text)}.{self.output_format}")
+            # An empty file is not a usable cache entry
+            if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
+                with self._stats_lock:
+                    self.cache_hits += 1
+                return output_file
             
+            with self._stats_lock:
+                self.cache_misses += 1
             # Generate direct audio for the question
-            audio_file = self._generate_audio(question['question'])
+            audio_file = self._generate_audio(text)
             
-            # Move the generated audio to the final location
-            os.rename(audio_file, output_file)
+            # Move the generated audio into place atomically, so a partial file is never served
+            os.replace(audio_file, output_file)
             return output_file
             
         except Exception as e:
             logging.error(f"Failed to generate question audio: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+    def cache_stats(self) -> Dict:
+        """Audio cache hit/miss counters"""
+        with self._stats_lock:
+            total = self.cache_hits + self.cache_misses
+            return {
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'hit_ratio': self.cache_hits / total if total else 0.0
+            }
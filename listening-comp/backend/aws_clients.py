@@ -0,0 +1,216 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+# Connection pool size per client; raise it if /api/aws-client-stats shows saturation
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "50"))
+# Attempts per call, including the first, under the adaptive retry mode
+AWS_MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "5"))
+AWS_CONNECT_TIMEOUT = float(os.environ.get("AWS_CONNECT_TIMEOUT", "5"))
+AWS_READ_TIMEOUT = float(os.environ.get("AWS_READ_TIMEOUT", "60"))
+
+_lock = threading.Lock()
+_sessions: Dict[Tuple, boto3.Session] = {}
+_clients: Dict[Tuple, object] = {}
+_stats: Dict[Tuple, "ClientStats"] = {}
+
+
+class _PoolFullCounter(logging.Filter):
+    """Counts urllib3's warnings about connections discarded from a full pool"""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.getMessage().startswith("Connection pool is full"):
+            self.count += 1
+        return True
+
+
+_pool_full = _PoolFullCounter()
+logging.getLogger("urllib3.connectionpool").addFilter(_pool_full)
+
+
+class ClientStats:
+    def __init__(self, service_name: str, max_pool_connections: int, window: int = 500):
+        """
+        Call latency and connection usage of one shared client.
+
+        in_flight and peak_in_flight count HTTP attempts, from sending the request
+        until its response headers arrive. A streamed body (invoke_model_with_response_stream)
+        keeps its connection while it is read, which is not counted, so the gauge
+        reads low while responses are streaming.
+
+        Args:
+            service_name (str): AWS service the client talks to
+            max_pool_connections (int): Size of the client's connection pool
+            window (int): Latency samples kept per operation
+        """
+        self.service_name = service_name
+        self.max_pool_connections = max_pool_connections
+        self.window = window
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.latencies: Dict[str, deque] = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.saturated = 0
+        self._lock = threading.Lock()
+
+    def before_call(self, model, context: Dict, **kwargs) -> None:
+        """Note when an operation starts, retries included"""
+        context['latency_start'] = time.perf_counter()
+        context['latency_operation'] = model.name
+
+    def after_call(self, model, context: Dict, parsed: Dict, **kwargs) -> None:
+        """Record an operation's total latency once it has a final response"""
+        start = context.get('latency_start')
+        if start is None:
+            return
+        operation = model.name
+        failed = 'Error' in parsed
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            if failed:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+            self.latencies.setdefault(operation, deque(maxlen=self.window)).append(time.perf_counter() - start)
+
+    def after_call_error(self, context: Dict, **kwargs) -> None:
+        """Count an operation that ended in a connection error or exhausted its retries"""
+        operation = context.get('latency_operation')
+        if operation is None:
+            return
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            self.errors[operation] = self.errors.get(operation, 0) + 1
+
+    def before_send(self, **kwargs) -> None:
+        """Count an HTTP attempt taking a connection from the pool"""
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.in_flight > self.max_pool_connections:
+                self.saturated += 1
+
+    def attempt_done(self, **kwargs) -> None:
+        """Count an HTTP attempt as done once its response headers are in, before any body is read"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def snapshot(self) -> Dict:
+        """Counters and latency percentiles per operation"""
+        with self._lock:
+            operations = {}
+            for operation, samples in self.latencies.items():
+                ordered = sorted(samples)
+
+                def percentile(pct: float) -> float:
+                    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)] * 1000
+
+                operations[operation] = {
+                    'calls': self.calls.get(operation, 0),
+                    'errors': self.errors.get(operation, 0),
+                    'p50_ms': percentile(50),
+                    'p95_ms': percentile(95),
+                    'p99_ms': percentile(99)
+                }
+            for operation, calls in self.calls.items():
+                operations.setdefault(operation, {'calls': calls, 'errors': self.errors.get(operation, 0)})
+            return {
+                'service': self.service_name,
+                'max_pool_connections': self.max_pool_connections,
+                # HTTP attempts awaiting response headers; streamed bodies being read are not counted
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                # Attempts that had to wait for, or open an extra, connection
+                'saturated_attempts': self.saturated,
+                'operations': operations
+            }
+
+
+def client_config(max_pool_connections: int = AWS_MAX_POOL_CONNECTIONS) -> Config:
+    """botocore settings shared by every client: pooled keep-alive connections and adaptive retries"""
+    return Config(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        connect_timeout=AWS_CONNECT_TIMEOUT,
+        read_timeout=AWS_READ_TIMEOUT,
+        retries={'max_attempts': AWS_MAX_ATTEMPTS, 'mode': 'adaptive'}
+    )
+
+
+def _register_hooks(client, stats: ClientStats) -> None:
+    """Attach the latency and connection-usage hooks to a client"""
+    events = client.meta.events
+    # Registered first so they run even if a later handler short-circuits the event
+    events.register_first('before-call.*.*', stats.before_call)
+    events.register_first('after-call.*.*', stats.after_call)
+    events.register_first('after-call-error.*.*', stats.after_call_error)
+    events.register_first('before-send.*.*', stats.before_send)
+    # needs-retry fires after every HTTP attempt, whether or not it is retried,
+    # but before a streamed response body is read
+    events.register_first('needs-retry.*.*', stats.attempt_done)
+
+
+def get_client(service_name: str, region_name: Optional[str] = None,
+               max_pool_connections: int = AWS_MAX_POOL_CONNECTIONS,
+               aws_access_key_id: Optional[str] = None, aws_secret_access_key: Optional[str] = None):
+    """
+    Get the process-wide client for an AWS service, creating it on first use.
+
+    boto3 clients are thread-safe, so one client per service, region and pool size
+    is shared by every caller, and connection setup is paid once per process.
+    Credentials default to the standard AWS credential chain.
+
+    Args:
+        service_name (str): AWS service, e.g. 'bedrock-runtime' or 'polly'
+        region_name (Optional[str]): Region, defaulting to the configured one
+        max_pool_connections (int): Connection pool size if the client is created now
+        aws_access_key_id (Optional[str]): Explicit access key instead of the credential chain
+        aws_secret_access_key (Optional[str]): Secret key matching aws_access_key_id
+
+    Returns:
+        The shared botocore client
+    """
+    key = (service_name, region_name, max_pool_connections, aws_access_key_id)
+    with _lock:
+        client = _clients.get(key)
+        if client is not None:
+            return client
+
+        # boto3 sessions are not thread-safe, so they are only used under the lock
+        session_key = (aws_access_key_id, aws_secret_access_key)
+        session = _sessions.get(session_key)
+        if session is None:
+            session = boto3.Session(aws_access_key_id=aws_access_key_id,
+                                    aws_secret_access_key=aws_secret_access_key)
+            _sessions[session_key] = session
+
+        client = session.client(service_name, region_name=region_name,
+                                config=client_config(max_pool_connections))
+        stats = ClientStats(service_name, max_pool_connections)
+        _register_hooks(client, stats)
+        _clients[key] = client
+        _stats[key] = stats
+        return client
+
+
+def client_stats() -> Dict:
+    """Usage of every shared client, plus connections urllib3 discarded from full pools"""
+    with _lock:
+        clients = [
+            {'region': key[1] or 'default', **stats.snapshot()}
+            for key, stats in _stats.items()
+        ]
+    return {
+        'clients': clients,
+        'pool_full_discards': _pool_full.count
+    }
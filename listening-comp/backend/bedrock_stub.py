@@ -0,0 +1,113 @@
+import io
+import json
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+
+class StubBedrockError(Exception):
+    """Error injected by StubBedrockClient"""
+
+
+class StubBedrockClient:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 seed: Optional[int] = None, token_latency: float = 0.0, token_chars: int = 8,
+                 model_latency: Optional[Dict[str, float]] = None,
+                 model_error_rate: Optional[Dict[str, float]] = None,
+                 spike_rate: float = 0.0, spike_latency: float = 0.0):
+        """
+        Local stand-in for the bedrock-runtime client, for benchmarks and offline runs.
+
+        Answers invoke_model with a well-formed Nova response containing a question
+        about the prompt's topic, after an injected delay, and can fail a fraction
+        of calls. invoke_model_with_response_stream sends the same text in small
+        chunks, the first after the injected delay and the rest token_latency apart.
+        Latency and errors can be set per model id, and a fraction of calls can be
+        slowed by a latency spike to reproduce tail latency.
+
+        Args:
+            latency (float): Base delay per call in seconds
+            jitter (float): Extra random delay of up to this many seconds
+            error_rate (float): Fraction of calls (0 to 1) that raise StubBedrockError
+            seed (Optional[int]): Seed for the jitter and error draws
+            token_latency (float): Delay between streamed chunks in seconds
+            token_chars (int): Characters of text per streamed chunk
+            model_latency (Optional[Dict[str, float]]): Base delay per model id, overriding latency
+            model_error_rate (Optional[Dict[str, float]]): Error rate per model id, overriding error_rate
+            spike_rate (float): Fraction of calls (0 to 1) delayed by spike_latency on top
+            spike_latency (float): Extra delay of a spiked call in seconds
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.token_latency = token_latency
+        self.token_chars = token_chars
+        self.model_latency = model_latency or {}
+        self.model_error_rate = model_error_rate or {}
+        self.spike_rate = spike_rate
+        self.spike_latency = spike_latency
+        self.calls = 0
+        self.calls_by_model: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate(self, model_id: str) -> None:
+        """Count the call, sleep for the model's injected latency and maybe fail"""
+        with self._lock:
+            self.calls += 1
+            self.calls_by_model[model_id] = self.calls_by_model.get(model_id, 0) + 1
+            delay = self.model_latency.get(model_id, self.latency) + self._random.uniform(0, self.jitter)
+            if self._random.random() < self.spike_rate:
+                delay += self.spike_latency
+            fail = self._random.random() < self.model_error_rate.get(model_id, self.error_rate)
+        time.sleep(delay)
+        if fail:
+            raise StubBedrockError("Injected Bedrock failure")
+
+    @staticmethod
+    def _question_text(prompt: str) -> str:
+        """Build the JSON question the model would answer with"""
+        match = re.search(r"question about (.+?)\. The question should", prompt, re.DOTALL)
+        topic = match.group(1).strip() if match else "Italian grammar"
+        return json.dumps({
+            "question": "Qual è la forma corretta del verbo 'essere' per 'noi'?",
+            "options": ["siamo", "sono", "siete"],
+            "answer": "siamo",
+            "explanation": f"Practice question about {topic}: 'noi' takes the first person plural 'siamo'."
+        }, ensure_ascii=False)
+
+    def invoke_model(self, modelId: str, body: str, contentType: str = 'application/json',
+                     accept: str = 'application/json', **kwargs) -> Dict:
+        """Mimic bedrock-runtime invoke_model for Nova models"""
+        self._simulate(modelId)
+        request = json.loads(body)
+        prompt = request['messages'][0]['content'][0]['text']
+        response = {
+            "output": {"message": {"role": "assistant", "content": [{"text": self._question_text(prompt)}]}},
+            "stopReason": "end_turn"
+        }
+        return {'body': io.BytesIO(json.dumps(response).encode('utf-8'))}
+
+    def invoke_model_with_response_stream(self, modelId: str, body: str, contentType: str = 'application/json',
+                                          accept: str = 'application/json', **kwargs) -> Dict:
+        """Mimic bedrock-runtime invoke_model_with_response_stream for Nova models"""
+        self._simulate(modelId)
+        request = json.loads(body)
+        text = self._question_text(request['messages'][0]['content'][0]['text'])
+        return {'body': self._stream_events(text)}
+
+    def _stream_events(self, text: str) -> Iterator[Dict]:
+        """Yield Nova stream events carrying the text a few characters at a time"""
+        def event(payload: Dict) -> Dict:
+            return {'chunk': {'bytes': json.dumps(payload).encode('utf-8')}}
+
+        yield event({"messageStart": {"role": "assistant"}})
+        for start in range(0, len(text), self.token_chars):
+            if start:
+                time.sleep(self.token_latency)
+            yield event({"contentBlockDelta": {"delta": {"text": text[start:start + self.token_chars]},
+                                               "contentBlockIndex": 0}})
+        yield event({"contentBlockStop": {"contentBlockIndex": 0}})
+        yield event({"messageStop": {"stopReason": "end_turn"}})
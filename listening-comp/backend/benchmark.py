@@ -0,0 +1,363 @@
+"""
+Benchmark suite for the listening-comp retrieval path.
+
+Builds a synthetic Italian question corpus at the requested scales, indexes it into
+a throwaway QuestionVectorStore, and measures indexing throughput, search and
+hydration latency, resident memory and end-to-end generate_question latency with a
+stubbed Bedrock client. Results are written as JSON so runs can be compared.
+
+Usage (from the listening-comp directory):
+    python3 -m backend.benchmark --scales 1000 10000 --backends chroma numpy --output results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from backend.bedrock_stub import StubBedrockClient
+from backend.llm_cache import LLMResponseCache
+from backend.rag import RAGQuestionGenerator
+from backend.vector_store import QuestionVectorStore
+
+# A mix of English topics (as typed in the UI) and Italian phrasings that also
+# overlap lexically with the corpus, so the hashing embedding retrieves something
+SEARCH_TOPICS = [
+    "verb conjugation",
+    "definite articles",
+    "prepositions with cities",
+    "plural nouns",
+    "coniugazione del verbo essere",
+    "quale articolo determinativo",
+    "preposizione con le città",
+    "il plurale dei nomi"
+]
+
+NAMES = ["Marco", "Giulia", "Luca", "Sofia", "Matteo", "Chiara", "Paolo", "Elena", "Andrea", "Francesca"]
+
+PRESENT_TENSE = {
+    "parlare": ["parlo", "parli", "parla", "parliamo", "parlate", "parlano"],
+    "mangiare": ["mangio", "mangi", "mangia", "mangiamo", "mangiate", "mangiano"],
+    "scrivere": ["scrivo", "scrivi", "scrive", "scriviamo", "scrivete", "scrivono"],
+    "dormire": ["dormo", "dormi", "dorme", "dormiamo", "dormite", "dormono"],
+    "finire": ["finisco", "finisci", "finisce", "finiamo", "finite", "finiscono"],
+    "costruire": ["costruisco", "costruisci", "costruisce", "costruiamo", "costruite", "costruiscono"],
+    "essere": ["sono", "sei", "è", "siamo", "siete", "sono"],
+    "avere": ["ho", "hai", "ha", "abbiamo", "avete", "hanno"],
+    "andare": ["vado", "vai", "va", "andiamo", "andate", "vanno"],
+    "fare": ["faccio", "fai", "fa", "facciamo", "fate", "fanno"]
+}
+SUBJECTS = ["io", "tu", "lei", "noi", "voi", "loro"]
+PERSONS = ["first person singular", "second person singular", "third person singular",
+           "first person plural", "second person plural", "third person plural"]
+
+ARTICLES = {
+    "libro": "il", "studente": "lo", "amica": "l'", "casa": "la", "zaino": "lo",
+    "ragazzi": "i", "studenti": "gli", "case": "le", "albero": "l'", "gatto": "il"
+}
+ARTICLE_REASONS = {
+    "il": "masculine singular nouns starting with a consonant take 'il'",
+    "lo": "masculine singular nouns starting with s+consonant or z take 'lo'",
+    "l'": "singular nouns starting with a vowel take the elided article l'",
+    "la": "feminine singular nouns starting with a consonant take 'la'",
+    "i": "masculine plural nouns starting with a consonant take 'i'",
+    "gli": "masculine plural nouns starting with a vowel, s+consonant or z take 'gli'",
+    "le": "feminine plural nouns take 'le'"
+}
+
+PLACES = {"Roma": "a", "Milano": "a", "Napoli": "a", "Firenze": "a",
+          "Italia": "in", "Francia": "in", "Spagna": "in", "Germania": "in"}
+
+PLURALS = {
+    "libro": ("libri", ["libre", "libros"]),
+    "casa": ("case", ["casi", "casas"]),
+    "amico": ("amici", ["amichi", "amice"]),
+    "città": ("città", ["cittài", "cittae"]),
+    "studente": ("studenti", ["studente", "studentes"]),
+    "lago": ("laghi", ["lagi", "lage"]),
+    "mano": ("mani", ["mane", "manos"]),
+    "uomo": ("uomini", ["uomi", "uome"])
+}
+
+
+class HashingEmbeddingFunction:
+    def __init__(self, dim: int = 384):
+        """
+        Cheap deterministic embedding (hashed bag of words).
+
+        Lets the benchmark measure store overhead without paying for model
+        inference; pass --embedding model to use the real embedding model.
+        """
+        self.dim = dim
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        vectors = []
+        for text in input:
+            vector = [0.0] * self.dim
+            for token in text.lower().split():
+                digest = hashlib.md5(token.encode('utf-8')).digest()
+                bucket = int.from_bytes(digest[:4], 'little') % self.dim
+                vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+            norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+            vectors.append([x / norm for x in vector])
+        return vectors
+
+
+def _synthetic_question(rng: random.Random, number: int, exercise: int) -> Dict:
+    """Build one multiple-choice grammar question from a random template"""
+    name = rng.choice(NAMES)
+    kind = rng.randrange(4)
+
+    if kind == 0:
+        verb = rng.choice(list(PRESENT_TENSE))
+        person = rng.randrange(6)
+        forms = PRESENT_TENSE[verb]
+        answer = forms[person]
+        wrong = rng.sample([f for f in dict.fromkeys(forms) if f != answer], 2)
+        question = f"Esercizio {exercise}: qual è la coniugazione corretta del verbo '{verb}' se il soggetto è '{SUBJECTS[person]}'?"
+        explanation = (f"We need the {PERSONS[person]} of the present tense of '{verb}', "
+                       f"as in '{name} dice: {SUBJECTS[person]} {answer}'.")
+    elif kind == 1:
+        noun = rng.choice(list(ARTICLES))
+        answer = ARTICLES[noun]
+        wrong = rng.sample([a for a in ARTICLE_REASONS if a != answer], 2)
+        question = f"Esercizio {exercise}: quale articolo determinativo va con '{noun}'?"
+        explanation = f"{ARTICLE_REASONS[answer].capitalize()}, so {name} says '{answer} {noun}'."
+    elif kind == 2:
+        place = rng.choice(list(PLACES))
+        answer = PLACES[place]
+        wrong = [p for p in ("a", "in", "di", "da") if p != answer][:2]
+        question = f"Esercizio {exercise}: {name} va ___ {place}. Quale preposizione è corretta?"
+        explanation = (f"Use 'a' with cities and 'in' with countries, so {name} va {answer} {place}.")
+    else:
+        noun = rng.choice(list(PLURALS))
+        answer, wrong = PLURALS[noun]
+        question = f"Esercizio {exercise}: qual è il plurale di '{noun}'?"
+        explanation = f"The plural of '{noun}' is '{answer}', as in '{name} ha due {answer}'."
+
+    options = [answer] + list(wrong)
+    rng.shuffle(options)
+    return {
+        "number": number,
+        "question": question,
+        "options": options,
+        "answer": answer,
+        "explanation": explanation
+    }
+
+
+def generate_corpus(directory: str, n_questions: int, questions_per_file: int = 10, seed: int = 42) -> int:
+    """
+    Write a synthetic corpus of Italian grammar questions as structured_data JSON files.
+
+    Args:
+        directory (str): Directory to write the files into
+        n_questions (int): Total number of questions
+        questions_per_file (int): Questions per video file
+        seed (int): Random seed, so a scale always produces the same corpus
+
+    Returns:
+        int: Number of files written
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    n_files = math.ceil(n_questions / questions_per_file)
+    for f in range(n_files):
+        count = min(questions_per_file, n_questions - f * questions_per_file)
+        questions = [
+            _synthetic_question(rng, number=i + 1, exercise=f * questions_per_file + i + 1)
+            for i in range(count)
+        ]
+        with open(os.path.join(directory, f"bench{f:06d}_questions.json"), 'w', encoding='utf-8') as out:
+            json.dump({"questions": questions}, out, ensure_ascii=False)
+    return n_files
+
+
+def _percentiles(samples: List[float]) -> Dict:
+    """p50/p99/mean of latency samples, in milliseconds"""
+    if not samples:
+        return {'count': 0}
+    cuts = statistics.quantiles(samples, n=100) if len(samples) > 1 else [samples[0]] * 99
+    return {
+        'count': len(samples),
+        'p50_ms': cuts[49] * 1000,
+        'p99_ms': cuts[98] * 1000,
+        'mean_ms': statistics.fmean(samples) * 1000
+    }
+
+
+def _time_calls(fn: Callable[[], object], repeats: int) -> List[float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _memory_mb() -> Dict:
+    """Current and peak resident memory of this process; each run has its own process"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_mb = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    current_mb = None
+    if os.path.exists('/proc/self/statm'):
+        with open('/proc/self/statm') as f:
+            current_mb = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    return {'rss_mb': current_mb, 'peak_rss_mb': peak_mb}
+
+
+def run_benchmark(n_questions: int, backend: str, layout: str, embedding: str, args) -> Dict:
+    """Index a corpus of n_questions into a fresh store and measure the retrieval path"""
+    work_dir = tempfile.mkdtemp(prefix="listening-bench-")
+    try:
+        structured_dir = os.path.join(work_dir, "structured_data")
+        n_files = generate_corpus(structured_dir, n_questions, seed=args.seed)
+
+        embedding_kwargs = {}
+        if embedding == "hash":
+            embedding_kwargs = {
+                'embedding_function': HashingEmbeddingFunction(),
+                'embedding_model_name': 'hashing-384'
+            }
+        with contextlib.redirect_stdout(io.StringIO()):
+            store = QuestionVectorStore(collection_name="benchmark", backend=backend, layout=layout,
+                                        data_dir=work_dir, **embedding_kwargs)
+
+            # Indexing throughput through the bulk ingestion path
+            start = time.perf_counter()
+            summary = store.bulk_index(structured_dir, 1, workers=args.workers, batch_size=args.batch_size)
+            index_seconds = time.perf_counter() - start
+
+        question_ids = [qid for entry in store.manifest['files'].values() for qid in entry['questions']]
+        rng = random.Random(args.seed)
+        topics = [rng.choice(SEARCH_TOPICS) for _ in range(args.queries)]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Cold searches pay for embedding, vector search and hydration
+            cold = []
+            for topic in topics:
+                store.query_cache.clear()
+                start = time.perf_counter()
+                store.search_similar_questions(1, topic, 3)
+                cold.append(time.perf_counter() - start)
+
+            # Warm searches are answered by the query cache
+            warm = _time_calls(lambda: store.search_similar_questions(1, topics[0], 3), args.queries)
+
+            hydration = _time_calls(
+                lambda: store._hydrate_questions(rng.sample(question_ids, min(3, len(question_ids)))),
+                args.queries
+            )
+
+            # End to end with a stubbed Bedrock client
+            generator = RAGQuestionGenerator(
+                vector_store=store,
+                bedrock_client=StubBedrockClient(latency=args.stub_latency, seed=args.seed),
+                llm_cache=LLMResponseCache(os.path.join(work_dir, "llm_cache", "responses.sqlite3"))
+            )
+
+            async def generate_all():
+                samples, generated = [], 0
+                for topic in topics[:args.generations]:
+                    store.query_cache.clear()
+                    start = time.perf_counter()
+                    question = await generator.generate_question(topic, bypass_cache=True)
+                    samples.append(time.perf_counter() - start)
+                    generated += question is not None
+                return samples, generated
+
+            generation_samples, generated = asyncio.run(generate_all())
+            generator._bedrock_executor.shutdown()
+
+        return {
+            'scale': n_questions,
+            'backend': backend,
+            'layout': layout,
+            'embedding': embedding,
+            'indexing': {
+                'files': n_files,
+                'questions': n_questions,
+                'documents': summary['documents'],
+                'vectors': store.collection.count(),
+                'seconds': index_seconds,
+                'questions_per_sec': n_questions / index_seconds,
+                'documents_per_sec': summary['documents'] / index_seconds
+            },
+            'search_cold': _percentiles(cold),
+            'search_warm': _percentiles(warm),
+            'hydration': _percentiles(hydration),
+            'generate_question': {
+                **_percentiles(generation_samples),
+                'stub_latency_ms': args.stub_latency * 1000,
+                'generated': generated
+            },
+            'memory': _memory_mb()
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the listening-comp retrieval path")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Corpus sizes in questions (default: 1000 10000 100000)")
+    parser.add_argument("--backends", nargs="+", default=["chroma"], choices=["chroma", "numpy"])
+    parser.add_argument("--layouts", nargs="+", default=["legacy"], choices=["legacy", "compact"])
+    parser.add_argument("--embedding", default="hash", choices=["hash", "model"],
+                        help="'hash' isolates store overhead; 'model' uses the real embedding model")
+    parser.add_argument("--queries", type=int, default=200, help="Searches per measurement")
+    parser.add_argument("--generations", type=int, default=20, help="generate_question calls per run")
+    parser.add_argument("--stub-latency", type=float, default=0.0,
+                        help="Seconds the stubbed Bedrock client waits per call")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes for bulk indexing")
+    parser.add_argument("--batch-size", type=int, default=256, help="Documents per upsert")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    args = parser.parse_args()
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args)
+        },
+        'runs': []
+    }
+    # ru_maxrss never goes down, so each run gets a fresh process to report its own peak
+    context = multiprocessing.get_context("spawn")
+    for scale in args.scales:
+        for backend in args.backends:
+            for layout in args.layouts:
+                print(f"Running scale={scale} backend={backend} layout={layout} embedding={args.embedding}...")
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    run = executor.submit(run_benchmark, scale, backend, layout, args.embedding, args).result()
+                results['runs'].append(run)
+                print(f"  indexing: {run['indexing']['questions_per_sec']:.0f} questions/sec, "
+                      f"search p50/p99: {run['search_cold']['p50_ms']:.2f}/{run['search_cold']['p99_ms']:.2f} ms, "
+                      f"generate p50: {run['generate_question']['p50_ms']:.2f} ms")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,8 @@
 # Create BedrockChat
 # bedrock_chat.py
-import boto3
 import streamlit as st
 from typing import Optional, Dict, Any
+from backend.aws_clients import get_client
 
 
 # Model ID
@@ -13,7 +13,8 @@ MODEL_ID = "amazon.nova-micro-v1:0"
 class BedrockChat:
     def __init__(self, model_id: str = MODEL_ID):
         """Initialize Bedrock chat client"""
-        self.bedrock_client = boto3.client('bedrock-runtime', region_name="us-east-1")
+        # Shared by every Streamlit session instead of one client per session
+        self.bedrock_client = get_client('bedrock-runtime', region_name="us-east-1")
         self.model_id = model_id
 
     def generate_response(self, message: str, inference_config: Optional[Dict[str, Any]] = None) -> Optional[str]:
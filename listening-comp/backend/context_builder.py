@@ -0,0 +1,181 @@
+import math
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+CONTEXT_HEADER = "Here are some example Italian language questions:\n\n"
+
+# Explanations are never cut shorter than this many characters
+MIN_EXPLANATION_CHARS = 80
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Nova models, at about four characters per token"""
+    return math.ceil(len(text) / 4)
+
+
+def format_example(index: int, question: Dict, explanation: Optional[str] = None) -> str:
+    """Format one retrieved question as a prompt example"""
+    example = f"Example {index}:\n"
+    example += f"Question: {question['question']}\n"
+    example += "Options:\n"
+    for opt in question['options']:
+        example += f"- {opt}\n"
+    example += f"Answer: {question['answer']}\n"
+    example += f"Explanation: {question['explanation'] if explanation is None else explanation}\n\n"
+    return example
+
+
+def format_context(questions: List[Dict]) -> str:
+    """Format questions into context for the LLM, without any selection or budget"""
+    return CONTEXT_HEADER + ''.join(format_example(i, q) for i, q in enumerate(questions, 1))
+
+
+def _words(question: Dict) -> Set[str]:
+    """Lowercased words of a question and its options"""
+    text = ' '.join([question['question'], *question['options']])
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    """Word overlap between two questions, from 0 to 1"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _relevance(question: Dict, rank: int, n_candidates: int) -> float:
+    """Relevance to the topic from the search similarity, falling back to search rank"""
+    similarity = question.get('similarity')
+    if isinstance(similarity, str) and similarity.endswith('%'):
+        try:
+            return float(similarity[:-1]) / 100
+        except ValueError:
+            pass
+    return 1.0 - rank / n_candidates
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Cut text to at most max_chars characters at a word boundary"""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars - 1].rsplit(' ', 1)[0]
+    return cut.rstrip(' ,;:.') + '…'
+
+
+def _explanation_cap(explanations: List[str], excess_chars: int) -> Optional[int]:
+    """
+    Longest explanation length that trims at least excess_chars in total.
+
+    Returns None when every explanation is already at the minimum length.
+    """
+    longest = max((len(explanation) for explanation in explanations), default=0)
+    if longest <= MIN_EXPLANATION_CHARS:
+        return None
+    low, high = MIN_EXPLANATION_CHARS, longest - 1
+    while low < high:
+        cap = (low + high + 1) // 2
+        if sum(max(0, len(explanation) - cap) for explanation in explanations) >= excess_chars:
+            low = cap
+        else:
+            high = cap - 1
+    return low
+
+
+class ContextBuilder:
+    def __init__(self, token_budget: int = 400, max_examples: int = 3, diversity: float = 0.3,
+                 duplicate_threshold: float = 0.8):
+        """
+        Build the example context for a RAG prompt within a token budget.
+
+        Examples are picked from the retrieved candidates by maximal marginal
+        relevance, so near-duplicates give way to examples that add something new,
+        and long explanations are shortened until the context fits the budget.
+
+        Args:
+            token_budget (int): Maximum estimated tokens for the whole context
+            max_examples (int): Maximum number of examples to include
+            diversity (float): Weight (0 to 1) of novelty against relevance when selecting
+            duplicate_threshold (float): Word overlap at which a candidate counts as a duplicate
+        """
+        self.token_budget = token_budget
+        self.max_examples = max_examples
+        self.diversity = diversity
+        self.duplicate_threshold = duplicate_threshold
+
+    def select(self, candidates: List[Dict]) -> List[Dict]:
+        """
+        Pick up to max_examples candidates by maximal marginal relevance.
+
+        Args:
+            candidates (List[Dict]): Retrieved questions, most similar first
+
+        Returns:
+            List[Dict]: The selected questions, in selection order
+        """
+        words = [_words(q) for q in candidates]
+        relevance = [_relevance(q, i, len(candidates)) for i, q in enumerate(candidates)]
+        selected: List[int] = []
+        remaining = list(range(len(candidates)))
+
+        while remaining and len(selected) < self.max_examples:
+            best, best_score = None, None
+            for i in remaining:
+                overlap = max((_jaccard(words[i], words[j]) for j in selected), default=0.0)
+                if overlap >= self.duplicate_threshold:
+                    continue
+                score = (1 - self.diversity) * relevance[i] - self.diversity * overlap
+                if best_score is None or score > best_score:
+                    best, best_score = i, score
+            if best is None:
+                break  # everything left duplicates an example already chosen
+            selected.append(best)
+            remaining.remove(best)
+
+        return [candidates[i] for i in selected]
+
+    def build(self, candidates: List[Dict]) -> Tuple[str, Dict]:
+        """
+        Select examples and format them into a context that fits the token budget.
+
+        Args:
+            candidates (List[Dict]): Retrieved questions, most similar first
+
+        Returns:
+            Tuple[str, Dict]: The context, and token stats comparing it with the
+            untrimmed top max_examples candidates
+        """
+        selected = self.select(candidates)
+        explanations = [q['explanation'] for q in selected]
+
+        def render() -> str:
+            return CONTEXT_HEADER + ''.join(
+                format_example(i, q, explanation)
+                for i, (q, explanation) in enumerate(zip(selected, explanations), 1)
+            )
+
+        context = render()
+        # Shorten the longest explanations first, then drop the least relevant example
+        while estimate_tokens(context) > self.token_budget:
+            excess_chars = (estimate_tokens(context) - self.token_budget) * 4
+            cap = _explanation_cap(explanations, excess_chars)
+            if cap is not None:
+                explanations = [_truncate(explanation, cap) for explanation in explanations]
+            elif len(selected) > 1:
+                selected.pop()
+                explanations.pop()
+            else:
+                break  # a single short example is always kept
+            context = render()
+
+        baseline_tokens = estimate_tokens(format_context(candidates[:self.max_examples]))
+        context_tokens = estimate_tokens(context)
+        stats = {
+            'candidates': len(candidates),
+            'examples': len(selected),
+            'baseline_tokens': baseline_tokens,
+            'context_tokens': context_tokens,
+            'tokens_saved': baseline_tokens - context_tokens
+        }
+        print(f"RAG context: {stats['examples']} of {stats['candidates']} candidates, "
+              f"{context_tokens} tokens (saved {stats['tokens_saved']} of {baseline_tokens})")
+        return context, stats
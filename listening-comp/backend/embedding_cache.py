@@ -0,0 +1,102 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Callable, Dict, List
+
+
+class EmbeddingCache:
+    def __init__(self, cache_path: str, model_name: str):
+        """
+        Initialize an on-disk cache of document embeddings.
+
+        Vectors are keyed by a hash of the embedding model name and the document
+        text, so unchanged documents never have to be embedded twice and switching
+        models never returns stale vectors.
+
+        Args:
+            cache_path (str): Path to the SQLite file holding the cached vectors
+            model_name (str): Name of the embedding model the vectors come from
+        """
+        self.cache_path = cache_path
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        """Hash a document together with the model name"""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Fetch the cached vectors for the given keys"""
+        found = {}
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            )
+            for key, blob in rows:
+                found[key] = array('f', blob).tolist()
+        return found
+
+    def embed(self, texts: List[str], embedding_function: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """
+        Return embeddings for the texts, computing only the ones not cached yet.
+
+        Args:
+            texts (List[str]): Documents to embed
+            embedding_function (Callable): Function that embeds a list of documents
+
+        Returns:
+            List[List[float]]: One embedding per input text, in input order
+        """
+        if not texts:
+            return []
+
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            vectors = self._lookup(list(dict.fromkeys(keys)))
+
+            # Embed each missing document once, even if it appears several times
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in vectors:
+                    missing.setdefault(key, text)
+
+            if missing:
+                new_vectors = embedding_function(list(missing.values()))
+                rows = []
+                for key, vector in zip(missing.keys(), new_vectors):
+                    vector = [float(x) for x in vector]
+                    vectors[key] = vector
+                    rows.append((key, array('f', vector).tobytes()))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+                )
+                self._conn.commit()
+
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+
+        return [vectors[key] for key in keys]
+
+    def stats(self) -> Dict:
+        """Hit/miss counts since this cache was opened"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0
+        }
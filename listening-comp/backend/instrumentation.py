@@ -0,0 +1,61 @@
+import contextlib
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import Histogram
+
+# Buckets from 1 ms (cache hits) up to 30 s (slow Bedrock completions)
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    'question_generation_stage_seconds',
+    'Time spent in each stage of question generation and retrieval',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+
+# Stage timings of the request being handled, for its Server-Timing header
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar('request_timings', default=None)
+
+
+def observe(name: str, seconds: float) -> None:
+    """Record a duration measured elsewhere as one run of a stage"""
+    STAGE_SECONDS.labels(stage=name).observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a block as one stage of the question-generation path.
+
+    The duration goes into the Prometheus histogram and, when called while
+    handling a request, into that request's Server-Timing header. Stages run
+    several times in one request add up.
+
+    Args:
+        name (str): Stage name, used as the histogram label and Server-Timing metric
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def start_request_timing() -> Dict[str, float]:
+    """Start collecting stage timings for the current request"""
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: Dict[str, float], total: Optional[float] = None) -> str:
+    """Format stage timings (in seconds) as a Server-Timing header value"""
+    metrics = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    if total is not None:
+        metrics.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(metrics)
@@ -0,0 +1,349 @@
+import contextlib
+import fcntl
+import json
+import os
+import re
+import threading
+from typing import Dict, Iterator, List, Optional
+
+SNAPSHOT_PATTERN = re.compile(r"^snapshot\.(\d+)\.jsonl$")
+LOG_PATTERN = re.compile(r"^log\.(\d+)\.jsonl$")
+
+
+class JSONLQuestionEngine:
+    def __init__(self, data_dir: str, legacy_json_path: Optional[str] = None,
+                 fsync_interval: float = 0.05, compact_threshold: int = 1000):
+        """
+        File-based storage engine for QuestionStore: a snapshot plus an append-only log.
+
+        Each insert appends one JSON line to log.{generation}.jsonl. The log is
+        fsynced by a background thread at most fsync_interval seconds after a
+        write, so bursts of inserts share one fsync. Once the log holds
+        compact_threshold questions, a background compaction starts a new log
+        generation and folds everything before it into snapshot.{generation}.jsonl.
+        Startup loads the newest snapshot and the logs written since. Questions
+        are indexed in memory by id and by topic, so lookups do not scan the store.
+
+        Several processes can share one data_dir. Writes and compaction hold an
+        exclusive lock on the directory's lock file and first read what other
+        processes appended, so ids never collide. Reads pick up new questions
+        when the log has grown or a newer log generation exists.
+
+        Args:
+            data_dir (str): Directory holding the snapshot and log files
+            legacy_json_path (Optional[str]): questions.json written by the old store, imported if
+                the directory is empty
+            fsync_interval (float): Seconds a write may wait for fsync; 0 fsyncs every insert
+            compact_threshold (int): Logged questions that trigger a compaction
+        """
+        self.data_dir = data_dir
+        self.fsync_interval = fsync_interval
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._closed = threading.Event()
+        self._compacting = False
+        self._log = None
+        self._log_generation = None
+
+        os.makedirs(data_dir, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(data_dir, 'lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        with self._lock, self._file_lock(fcntl.LOCK_EX):
+            if legacy_json_path:
+                self._import_json(legacy_json_path)
+            self._load()
+            # Creates the current log, so reads can tell "nothing new" from "compacted away"
+            self._open_log()
+
+        self._flusher = None
+        if fsync_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="jsonl-fsync", daemon=True)
+            self._flusher.start()
+
+    @contextlib.contextmanager
+    def _file_lock(self, operation: int) -> Iterator[None]:
+        """Hold the lock file shared (LOCK_SH) or exclusively (LOCK_EX) across processes"""
+        fcntl.flock(self._lock_fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _snapshot_path(self, generation: int) -> str:
+        return os.path.join(self.data_dir, f"snapshot.{generation}.jsonl")
+
+    def _log_path(self, generation: int) -> str:
+        return os.path.join(self.data_dir, f"log.{generation}.jsonl")
+
+    def _generations(self, pattern: re.Pattern) -> List[int]:
+        """Generations of the files in data_dir matching the pattern, oldest first"""
+        generations = []
+        for name in os.listdir(self.data_dir):
+            match = pattern.match(name)
+            if match:
+                generations.append(int(match.group(1)))
+        return sorted(generations)
+
+    def _index(self, records: List[Dict]) -> None:
+        """Add loaded or inserted questions to the list and the id and topic indexes"""
+        for question in records:
+            self.questions.append(question)
+            self._by_id[question['id']] = question
+            self._by_topic.setdefault(question.get('topic'), []).append(question)
+            question_id = str(question['id'])
+            if question_id.isdigit():
+                self._next_id = max(self._next_id, int(question_id) + 1)
+
+    @staticmethod
+    def _parse_lines(data: bytes, path: str) -> List[Dict]:
+        """Parse complete JSONL lines, skipping any that are malformed"""
+        records = []
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Skipping incomplete record in {path}")
+        return records
+
+    def _write_snapshot(self, generation: int, records: List[Dict]) -> None:
+        """Write a snapshot atomically: temp file, fsync, rename"""
+        path = self._snapshot_path(generation)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_dir()
+
+    def _fsync_dir(self) -> None:
+        """Make renames and new files in data_dir durable"""
+        fd = os.open(self.data_dir, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _import_json(self, json_path: str) -> None:
+        """Turn the legacy JSON file into the first snapshot if the directory is empty"""
+        if self._generations(SNAPSHOT_PATTERN) or self._generations(LOG_PATTERN):
+            return
+        if not os.path.exists(json_path):
+            return
+        with open(json_path, 'r') as f:
+            legacy = json.load(f)
+        self._write_snapshot(0, legacy)
+        if legacy:
+            print(f"Imported {len(legacy)} questions from {json_path}")
+
+    def _load(self) -> None:
+        """Load the newest snapshot plus the logs written after it"""
+        self.questions: List[Dict] = []
+        self._by_id: Dict[str, Dict] = {}
+        self._by_topic: Dict[str, List[Dict]] = {}
+        self._next_id = 1
+
+        snapshots = self._generations(SNAPSHOT_PATTERN)
+        base = snapshots[-1] if snapshots else 0
+        if snapshots:
+            path = self._snapshot_path(base)
+            with open(path, 'rb') as f:
+                self._index(self._parse_lines(f.read(), path))
+
+        self.generation = base
+        self._log_offset = 0
+        self._log_records = 0
+        for generation in self._generations(LOG_PATTERN):
+            if generation >= base:
+                self.generation = generation
+                self._log_offset = 0
+                self._log_records = 0
+                self._read_log_tail()
+
+    def _read_log_tail(self) -> None:
+        """Index the complete lines appended to the current log since it was last read"""
+        path = self._log_path(self.generation)
+        with open(path, 'rb') as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        # A partial last line is either being written or was cut short by a crash
+        end = data.rfind(b'\n') + 1
+        records = self._parse_lines(data[:end], path)
+        self._index(records)
+        self._log_offset += end
+        self._log_records += len(records)
+
+    def _changed(self) -> bool:
+        """Whether another process may have written since the last read; two stat calls"""
+        try:
+            # Logs are append-only, so any write changes the size
+            size = os.stat(self._log_path(self.generation)).st_size
+        except FileNotFoundError:
+            return True
+        return size != self._log_offset or os.path.exists(self._log_path(self.generation + 1))
+
+    def _catch_up(self) -> None:
+        """Read what other processes wrote, following log rotations; needs the file lock"""
+        while True:
+            if not os.path.exists(self._log_path(self.generation)):
+                # Compacted away by another process: start again from its snapshot
+                self._load()
+                return
+            self._read_log_tail()
+            if not os.path.exists(self._log_path(self.generation + 1)):
+                return
+            self.generation += 1
+            self._log_offset = 0
+            self._log_records = 0
+
+    def _refresh(self) -> None:
+        """Pick up questions written by other processes before answering a read"""
+        if self._changed():
+            with self._file_lock(fcntl.LOCK_SH):
+                self._catch_up()
+
+    def _open_log(self):
+        """This process's append handle for the current log generation"""
+        if self._log_generation != self.generation:
+            if self._log is not None:
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._log.close()
+            self._log = open(self._log_path(self.generation), 'ab')
+            self._log_generation = self.generation
+        return self._log
+
+    def _flush_loop(self) -> None:
+        """fsync the log shortly after writes, one fsync per batch of inserts"""
+        while not self._closed.is_set():
+            self._dirty.wait()
+            self._closed.wait(self.fsync_interval)
+            self._dirty.clear()
+            with self._lock:
+                if self._log is not None and not self._log.closed:
+                    os.fsync(self._log.fileno())
+
+    def add(self, records: List[Dict]) -> List[str]:
+        """
+        Append questions to the log.
+
+        Args:
+            records (List[Dict]): Questions with 'timestamp' and 'topic' set
+
+        Returns:
+            List[str]: The new question ids, in input order
+        """
+        with self._lock:
+            with self._file_lock(fcntl.LOCK_EX):
+                self._catch_up()
+                log = self._open_log()
+                # Drop a partial line left by a writer that crashed mid-append
+                if os.fstat(log.fileno()).st_size > self._log_offset:
+                    log.truncate(self._log_offset)
+
+                stored = []
+                for record in records:
+                    stored.append({'id': str(self._next_id), **record})
+                    self._next_id += 1
+                data = ''.join(json.dumps(q, ensure_ascii=False) + '\n' for q in stored).encode('utf-8')
+                log.write(data)
+                log.flush()
+                if self.fsync_interval <= 0:
+                    os.fsync(log.fileno())
+                self._log_offset += len(data)
+                self._log_records += len(stored)
+                self._index(stored)
+            if self.fsync_interval > 0:
+                self._dirty.set()
+
+            if self._log_records >= self.compact_threshold and not self._compacting:
+                self._compacting = True
+                threading.Thread(target=self.compact, name="jsonl-compaction", daemon=True).start()
+        return [q['id'] for q in stored]
+
+    def compact(self) -> None:
+        """Fold the current snapshot and logs into a new snapshot, then drop the old files"""
+        try:
+            with self._lock, self._file_lock(fcntl.LOCK_EX):
+                self._catch_up()
+                if self._log_records < self.compact_threshold:
+                    # Another process compacted first
+                    return
+                # New writes, from every process, go to the next generation's log from here on
+                old_generation = self.generation
+                self.generation += 1
+                self._open_log()
+                self._log_offset = 0
+                self._log_records = 0
+                records = list(self.questions)
+
+            # Until this rename, a restart still finds the old snapshot and all logs
+            self._write_snapshot(old_generation + 1, records)
+            with self._lock, self._file_lock(fcntl.LOCK_EX):
+                for generation in self._generations(SNAPSHOT_PATTERN):
+                    if generation <= old_generation:
+                        os.remove(self._snapshot_path(generation))
+                for generation in self._generations(LOG_PATTERN):
+                    if generation <= old_generation:
+                        os.remove(self._log_path(generation))
+        except Exception as e:
+            print(f"Error compacting question log: {str(e)}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def get(self, question_id: str) -> Optional[Dict]:
+        """Look up one question by id"""
+        with self._lock:
+            self._refresh()
+            return self._by_id.get(question_id)
+
+    def find(self, record: Dict) -> Optional[str]:
+        """Id of the first stored question with the same topic and content as the record"""
+        content = {key: value for key, value in record.items() if key not in ('timestamp', 'topic')}
+        with self._lock:
+            self._refresh()
+            for question in self._by_topic.get(record['topic'], []):
+                if {key: value for key, value in question.items()
+                        if key not in ('id', 'timestamp', 'topic')} == content:
+                    return question['id']
+        return None
+
+    def list(self, topic: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """A page of questions in insertion order, optionally only those with the given topic"""
+        end = offset + limit if limit is not None else None
+        with self._lock:
+            self._refresh()
+            questions = self._by_topic.get(topic, []) if topic else self.questions
+            return questions[offset:end]
+
+    def count(self, topic: Optional[str] = None) -> int:
+        """Number of stored questions, optionally only those with the given topic"""
+        with self._lock:
+            self._refresh()
+            return len(self._by_topic.get(topic, [])) if topic else len(self.questions)
+
+    def is_empty(self) -> bool:
+        """Whether no questions are stored"""
+        with self._lock:
+            self._refresh()
+            return not self.questions
+
+    def version(self) -> int:
+        """Counter that changes whenever a question is added, by any process"""
+        # Questions are only ever appended, so the count serves as the version
+        return self.count()
+
+    def close(self) -> None:
+        """Flush and fsync the log and stop the background thread"""
+        self._closed.set()
+        self._dirty.set()
+        with self._lock:
+            if self._log is not None and not self._log.closed:
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._log.close()
+            os.close(self._lock_fd)
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class LLMResponseCache:
+    def __init__(self, cache_path: str, ttl_seconds: float = 86400.0, max_entries: int = 5000,
+                 clock: Callable[[], float] = time.time):
+        """
+        Initialize an on-disk cache of LLM responses.
+
+        Responses are keyed by a hash of the model id, the prompt and the inference
+        config, expire after a TTL, and the least recently used entries are evicted
+        once the cache holds more than max_entries.
+
+        Args:
+            cache_path (str): Path to the SQLite file holding the cached responses
+            ttl_seconds (float): Seconds a response stays valid after it is stored
+            max_entries (int): Responses kept before the least recently used is evicted
+            clock (Callable[[], float]): Time source, overridable for tests and benchmarks
+        """
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_id: str, prompt: str, inference_config: Dict) -> str:
+        """Hash the model id, prompt and inference config into a cache key"""
+        payload = json.dumps(
+            {'model_id': model_id, 'prompt': prompt, 'inference_config': inference_config},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response, or None if it is missing or expired"""
+        now = self._clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if created_at + self.ttl_seconds <= now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def set(self, key: str, response: str) -> None:
+        """Store a response, evicting the least recently used entries if full"""
+        now = self._clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            excess = self._size() - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_used LIMIT ?)", (excess,)
+                )
+                self.evictions += excess
+            self._conn.commit()
+
+    def record_bypass(self) -> None:
+        """Count a lookup skipped because the caller asked for a fresh response"""
+        with self._lock:
+            self.bypasses += 1
+
+    def _size(self) -> int:
+        """Number of stored responses, expired ones included"""
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self) -> Dict:
+        """Size and hit-ratio counters since this cache was opened"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': self._size(),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'bypasses': self.bypasses,
+                'expirations': self.expirations,
+                'evictions': self.evictions
+            }
@@ -1,11 +1,19 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+import os
+import time
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import BaseModel, Field
 from typing import Optional, Dict, List
 from backend.rag import RAGQuestionGenerator
+from backend.question_pool import QuestionPool
 from backend.question_store import QuestionStore
 from backend.audio_generator import AudioGenerator
+from backend.aws_clients import client_stats
+from backend.instrumentation import server_timing_header, stage, start_request_timing
 
 app = FastAPI(title="Italian Learning Question Generator")
 
@@ -18,22 +26,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    """Report the time spent in each question-generation stage as a Server-Timing header"""
+    timings = start_request_timing()
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Streaming responses only include the stages finished before the headers were sent
+    response.headers["Server-Timing"] = server_timing_header(timings, time.perf_counter() - start)
+    return response
+
 # Initialize services
 question_generator = RAGQuestionGenerator()
 question_store = QuestionStore()
 audio_generator = AudioGenerator()
 
+# Popular topics to keep pre-generated questions ready for (comma-separated)
+QUESTION_POOL_TOPICS = [topic.strip() for topic in os.environ.get("QUESTION_POOL_TOPICS", "").split(",") if topic.strip()]
+question_pool = QuestionPool(
+    question_generator,
+    QUESTION_POOL_TOPICS,
+    target_depth=int(os.environ.get("QUESTION_POOL_TARGET", "5")),
+    low_water=int(os.environ.get("QUESTION_POOL_LOW_WATER", "2"))
+)
+
+@app.on_event("startup")
+async def start_question_pool():
+    """Start refilling the question pool in the background"""
+    question_pool.start()
+
+@app.on_event("shutdown")
+async def stop_question_pool():
+    """Stop the question pool's background refill"""
+    await question_pool.stop()
+
+@app.on_event("shutdown")
+async def close_question_store():
+    """Flush saved questions to disk"""
+    question_store.close()
+
+def _save_questions(questions: List[Dict], from_cache: List[bool]) -> List[str]:
+    """
+    Save generated questions in one write and return their ids.
+    
+    A question answered from the LLM response cache was already saved when it
+    was first generated, so it gets that copy's id instead of a duplicate entry.
+    """
+    question_ids = [None] * len(questions)
+    for i, question in enumerate(questions):
+        if from_cache[i]:
+            question_ids[i] = question_store.find_question(question)
+    new = [i for i, question_id in enumerate(question_ids) if question_id is None]
+    for i, question_id in zip(new, question_store.add_questions([questions[i] for i in new])):
+        question_ids[i] = question_id
+    return question_ids
+
 class QuestionRequest(BaseModel):
     topic: str
     section_num: Optional[int] = 1
+    bypass_cache: Optional[bool] = False
 
 @app.post("/api/generate-question")
 async def generate_question(request: QuestionRequest) -> Dict:
     """Generate a new Italian language question about the given topic"""
-    question = await question_generator.generate_question(
-        topic=request.topic,
-        section_num=request.section_num
-    )
+    # Popular topics are served from the pre-generated pool when it has questions ready
+    question = None
+    if question_pool.handles(request.topic, request.section_num):
+        with stage("pool"):
+            question = question_pool.pop(request.topic)
+    if question is None:
+        question = await question_generator.generate_question(
+            topic=request.topic,
+            section_num=request.section_num,
+            bypass_cache=request.bypass_cache
+        )
     
     if not question:
         raise HTTPException(
@@ -42,31 +108,205 @@ async def generate_question(request: QuestionRequest) -> Dict:
         )
     
     # Add topic to question data
+    from_cache = question.pop('cached', False)
     question['topic'] = request.topic
     
     # Save the generated question
-    question_id = question_store.add_question(question)
+    with stage("store"):
+        question_id = _save_questions([question], [from_cache])[0]
     question['id'] = question_id
     
     return question
 
+def _sse(event: str, data: Dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/api/generate-question/stream")
+async def generate_question_stream(request: QuestionRequest):
+    """
+    Generate a new Italian language question, streamed as server-sent events.
+    
+    'partial' events carry the text so far of a field still being written,
+    'field' events a completed and validated field. The stream ends with a
+    'complete' event holding the saved question (with its id) or an 'error' event.
+    """
+    async def events():
+        async for event in question_generator.generate_question_stream(
+            topic=request.topic,
+            section_num=request.section_num,
+            bypass_cache=request.bypass_cache
+        ):
+            if event['event'] == 'complete':
+                question = event['question']
+                question['topic'] = request.topic
+                question['id'] = _save_questions([question], [event['cached']])[0]
+                yield _sse('complete', question)
+            else:
+                yield _sse(event['event'], {key: value for key, value in event.items() if key != 'event'})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Upper bound on questions generated by one batch request
+MAX_BATCH_QUESTIONS = 50
+
+class BatchQuestionRequest(BaseModel):
+    topics: Optional[List[str]] = None
+    topic: Optional[str] = None
+    # Bounded here so an oversized count is rejected before any list is built
+    count: int = Field(default=1, ge=1, le=MAX_BATCH_QUESTIONS)
+    section_num: Optional[int] = 1
+    bypass_cache: Optional[bool] = False
+
+@app.post("/api/generate-questions")
+async def generate_questions(request: BatchQuestionRequest):
+    """
+    Generate a batch of Italian language questions, streamed as NDJSON.
+    
+    Pass either a list of topics (one question each) or a single topic with a
+    count. Each question is sent as its own line as soon as it is generated,
+    failures as {"topic": ..., "error": ...}. All generated questions are saved
+    in one write at the end, also if the client disconnects mid-stream, and a
+    final {"done": true, ...} line lists their ids in the order the questions
+    were sent.
+    """
+    if request.topics:
+        topics = request.topics
+    elif request.topic:
+        topics = [request.topic] * request.count
+    else:
+        topics = []
+    if not topics:
+        raise HTTPException(status_code=400, detail="Provide either topics or a topic and a positive count.")
+    if len(topics) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch can generate at most {MAX_BATCH_QUESTIONS} questions."
+        )
+    
+    async def ndjson_lines():
+        generated = []
+        from_cache = []
+        failed = 0
+        try:
+            async for index, topic, question in question_generator.generate_questions(
+                topics, request.section_num, request.bypass_cache
+            ):
+                if question is None:
+                    failed += 1
+                    yield json.dumps({"index": index, "topic": topic, "error": "Failed to generate question"}) + "\n"
+                    continue
+                from_cache.append(question.pop('cached', False))
+                question['topic'] = topic
+                generated.append(question)
+                yield json.dumps({"index": index, **question}, ensure_ascii=False) + "\n"
+        finally:
+            # Save the whole batch at once, keeping what was generated before a disconnect
+            question_ids = _save_questions(generated, from_cache)
+        yield json.dumps({"done": True, "generated": len(generated), "failed": failed, "ids": question_ids}) + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+# Page size of /api/stored-questions when no limit is given, and the largest allowed
+STORED_QUESTIONS_PAGE_SIZE = 100
+MAX_STORED_QUESTIONS_PAGE_SIZE = 1000
+
 @app.get("/api/stored-questions")
-async def get_stored_questions() -> List[Dict]:
-    """Get all questions stored in the vector store"""
+async def get_stored_questions(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(STORED_QUESTIONS_PAGE_SIZE, ge=1, le=MAX_STORED_QUESTIONS_PAGE_SIZE),
+    stream: bool = False
+):
+    """
+    Get questions stored in the vector store.
+    
+    Supports offset/limit paging; pages hold at most 1000 questions. With
+    stream=true the questions are sent as NDJSON (one JSON object per line)
+    while they are read from the store.
+    """
+    vector_store = question_generator.vector_store
+    if stream:
+        def ndjson_lines():
+            for question in vector_store.iter_questions(offset=offset, limit=limit):
+                yield json.dumps(question, ensure_ascii=False) + "\n"
+        
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+    
     try:
-        # Get questions from vector store
-        questions = question_generator.vector_store.get_all_questions()
-        return questions
+        # Get questions from vector store; the reads block, so they run in a worker thread
+        return await asyncio.to_thread(lambda: list(vector_store.iter_questions(offset=offset, limit=limit)))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to fetch stored questions: {str(e)}"
         )
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    """Prometheus metrics, including per-stage question-generation latency histograms"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/api/cache-stats")
+async def get_cache_stats() -> Dict:
+    """Get hit-ratio statistics for the backend caches"""
+    return {
+        "query_cache": question_generator.vector_store.query_cache.stats(),
+        "llm_cache": question_generator.llm_cache.stats(),
+        "audio_cache": audio_generator.cache_stats()
+    }
+
+@app.get("/api/model-stats")
+async def get_model_stats() -> Dict:
+    """Get per-model Bedrock latency, errors and circuit state, plus hedging counters"""
+    return question_generator.router.stats()
+
+@app.get("/api/aws-client-stats")
+async def get_aws_client_stats() -> Dict:
+    """Get per-operation latency and connection pool usage of the shared AWS clients"""
+    return client_stats()
+
+@app.get("/api/question-pool/stats")
+async def get_question_pool_stats() -> Dict:
+    """Get the depth and refill lag of the pre-generated question pool"""
+    return question_pool.stats()
+
+def _not_modified(request: Request, etag: str) -> bool:
+    """Whether the client's If-None-Match already names the current ETag"""
+    if_none_match = request.headers.get("if-none-match", "")
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in tags or "*" in tags
+
+def _conditional_json(request: Request, content) -> Response:
+    """
+    JSON response tagged with the question store's version.
+    
+    Answers 304 Not Modified when the client already has this version, so
+    polling clients only download questions again after one has been added.
+    The content callable is only run for a full response.
+    """
+    etag = f'"{question_store.version()}"'
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(content(), headers={"ETag": etag})
+
 @app.get("/api/practice-questions")
-async def get_practice_questions(topic: Optional[str] = None) -> List[Dict]:
-    """Get all saved practice questions, optionally filtered by topic"""
-    return question_store.get_questions(topic)
+async def get_practice_questions(
+    request: Request,
+    topic: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1)
+) -> Response:
+    """Get saved practice questions, optionally filtered by topic and paged with offset/limit"""
+    return _conditional_json(request, lambda: question_store.get_questions(topic, limit=limit, offset=offset))
+
+@app.get("/api/practice-questions/count")
+async def count_practice_questions(request: Request, topic: Optional[str] = None) -> Response:
+    """Get the number of saved practice questions, optionally filtered by topic"""
+    return _conditional_json(request, lambda: {"count": question_store.count_questions(topic)})
 
 @app.get("/api/practice-questions/{question_id}")
 async def get_practice_question(question_id: str) -> Dict:
@@ -91,8 +331,8 @@ async def get_question_audio(question_id: str):
         )
     
     try:
-        # Generate audio file
-        audio_file = audio_generator.generate_question_audio(question)
+        # Served from the audio cache; on a miss Polly runs off the event loop
+        audio_file = await asyncio.to_thread(audio_generator.generate_question_audio, question)
         return FileResponse(
             audio_file,
             media_type="audio/mpeg",
@@ -106,4 +346,7 @@ async def get_question_audio(question_id: str):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # Worker processes; each one has its own question pool and Prometheus metrics
+    workers = int(os.environ.get("UVICORN_WORKERS", "1"))
+    # Workers re-import the app, so it is passed by import string
+    uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, workers=workers) 
\ No newline at end of file
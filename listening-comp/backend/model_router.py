@@ -0,0 +1,261 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, Optional, Tuple
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        """
+        Rolling window of recent call latencies for one model.
+
+        Args:
+            window (int): Number of most recent samples kept
+        """
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """Add one call's latency"""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, or None if it is empty"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[max(0, math.ceil(pct / 100 * len(samples)) - 1)]
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Stop sending calls to a model after repeated failures.
+
+        After failure_threshold consecutive failures the circuit opens and calls
+        are refused. Once reset_timeout has passed it lets a single trial call
+        through (half open): success closes the circuit, failure opens it again.
+
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit
+            reset_timeout (float): Seconds the circuit stays open before a trial call
+            clock (Callable[[], float]): Time source, overridable for tests
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.opens = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        """Move from open to half open once the reset timeout has passed"""
+        if self._state == OPEN and self._clock() >= self._opened_at + self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a call may be sent now; a half-open circuit admits one trial call"""
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call"""
+        with self._lock:
+            self._failures = 0
+            self._state = CLOSED
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        """Count a failed call, opening the circuit if there were too many in a row"""
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.opens += 1
+                self._state = OPEN
+                self._opened_at = self._clock()
+                self._trial_in_flight = False
+
+
+class ModelRouter:
+    def __init__(self, call: Callable[[str, str], Optional[str]], executor: Executor, models: List[str],
+                 hedge_delay: float = 2.0, min_samples: int = 20, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0):
+        """
+        Route prompts across Bedrock models with hedging and circuit breaking.
+
+        Each prompt goes to the first model whose circuit is closed. If it has not
+        answered by that model's p95 latency, a hedge request goes to the next
+        model and the first successful answer wins. A call that fails outright
+        fails over to the next model straight away.
+
+        Args:
+            call (Callable[[str, str], Optional[str]]): Blocking call taking (model id, prompt)
+                and returning the response text; raising or returning None is a failure
+            executor (Executor): Thread pool the blocking calls run on
+            models (List[str]): Model ids in order of preference
+            hedge_delay (float): Seconds to wait before hedging until a model has min_samples latencies
+            min_samples (int): Latency samples needed before a model's own p95 is used
+            failure_threshold (int): Consecutive failures that open a model's circuit
+            reset_timeout (float): Seconds a model's circuit stays open before a trial call
+        """
+        self.call = call
+        self.executor = executor
+        self.models = models
+        self.hedge_delay = hedge_delay
+        self.min_samples = min_samples
+        self.latency = {model: LatencyTracker() for model in models}
+        self.breakers = {model: CircuitBreaker(failure_threshold, reset_timeout) for model in models}
+        self.calls = {model: 0 for model in models}
+        self.errors = {model: 0 for model in models}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def hedge_after(self, model: str) -> float:
+        """Seconds to wait for a model before sending a hedge request"""
+        if len(self.latency[model]) < self.min_samples:
+            return self.hedge_delay
+        return self.latency[model].percentile(95)
+
+    def pick_model(self, exclude: Optional[List[str]] = None) -> Optional[str]:
+        """First model in preference order whose circuit admits a call"""
+        for model in self.models:
+            if model not in (exclude or []) and self.breakers[model].allow_request():
+                return model
+        return None
+
+    def record_result(self, model: str, seconds: float, success: bool) -> None:
+        """Feed one call's outcome into the model's latency window and circuit breaker"""
+        with self._lock:
+            self.calls[model] += 1
+            if not success:
+                self.errors[model] += 1
+        if success:
+            self.latency[model].record(seconds)
+            self.breakers[model].record_success()
+        else:
+            self.breakers[model].record_failure()
+
+    def timed_call(self, model: str, prompt: str) -> str:
+        """Call a model, recording its latency and outcome; raises on failure"""
+        start = time.perf_counter()
+        try:
+            text = self.call(model, prompt)
+            if not text:
+                raise ValueError("Empty response")
+        except Exception as e:
+            self.record_result(model, time.perf_counter() - start, False)
+            print(f"Error invoking Bedrock model {model}: {str(e)}")
+            raise
+        self.record_result(model, time.perf_counter() - start, True)
+        return text
+
+    def _launch(self, model: str, prompt: str) -> asyncio.Future:
+        """Start a call on the executor"""
+        future = asyncio.get_running_loop().run_in_executor(self.executor, self.timed_call, model, prompt)
+        # Losing hedge calls finish unobserved; retrieve their errors so they are not reported
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return future
+
+    async def complete(self, prompt: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Get a response to the prompt, hedging or failing over to another model if needed.
+
+        Args:
+            prompt (str): Prompt to send
+
+        Returns:
+            Tuple[Optional[str], Optional[str]]: The model that answered and its response,
+            or (None, None) if every model failed
+        """
+        primary = self.pick_model()
+        if primary is None:
+            with self._lock:
+                self.rejected += 1
+            print("Error invoking Bedrock: every model's circuit is open")
+            return None, None
+
+        pending = {self._launch(primary, prompt): primary}
+        launched = [primary]
+        timeout = self.hedge_after(primary)
+        while pending:
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                model = pending.pop(future)
+                if future.exception() is None:
+                    if model != primary:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return model, future.result()
+
+            # The primary is slow (hedge) or failed (failover): bring in the next model
+            if len(launched) == 1:
+                secondary = self.pick_model(exclude=launched)
+                if secondary is not None:
+                    with self._lock:
+                        if done:
+                            self.failovers += 1
+                        else:
+                            self.hedges += 1
+                    pending[self._launch(secondary, prompt)] = secondary
+                    launched.append(secondary)
+            timeout = None
+        return None, None
+
+    def stats(self) -> Dict:
+        """Per-model latency, error and circuit state, plus hedging counters"""
+        models = {}
+        for model in self.models:
+            with self._lock:
+                calls, errors = self.calls[model], self.errors[model]
+            p50, p95, p99 = (self.latency[model].percentile(p) for p in (50, 95, 99))
+            models[model] = {
+                'calls': calls,
+                'errors': errors,
+                'p50_ms': p50 * 1000 if p50 is not None else None,
+                'p95_ms': p95 * 1000 if p95 is not None else None,
+                'p99_ms': p99 * 1000 if p99 is not None else None,
+                'hedge_after_ms': self.hedge_after(model) * 1000,
+                'circuit': self.breakers[model].state,
+                'circuit_opens': self.breakers[model].opens
+            }
+        with self._lock:
+            return {
+                'models': models,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'failovers': self.failovers,
+                'rejected': self.rejected
+            }
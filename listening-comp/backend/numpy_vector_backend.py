@@ -0,0 +1,500 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+
+def _group_key(metadata: Dict) -> Tuple:
+    """Rows are stored grouped by section and document type"""
+    return (metadata.get('section_num'), metadata.get('type'))
+
+
+def _sort_key(metadata: Dict) -> Tuple[str, str]:
+    section_num, doc_type = _group_key(metadata)
+    return (repr(section_num), repr(doc_type))
+
+
+def _matches(metadata: Dict, where: Optional[Dict]) -> bool:
+    """Evaluate a Chroma-style where filter against one metadata dict"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == '$and':
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, expected in condition.items():
+                if op == '$eq' and value != expected:
+                    return False
+                if op == '$ne' and value == expected:
+                    return False
+                if op == '$in' and value not in expected:
+                    return False
+                if op == '$nin' and value in expected:
+                    return False
+                if op in ('$gt', '$gte', '$lt', '$lte'):
+                    if value is None:
+                        return False
+                    if op == '$gt' and not value > expected:
+                        return False
+                    if op == '$gte' and not value >= expected:
+                        return False
+                    if op == '$lt' and not value < expected:
+                        return False
+                    if op == '$lte' and not value <= expected:
+                        return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _group_constraints(where: Optional[Dict]) -> Tuple[Dict, bool]:
+    """
+    Pull plain equality conditions on section_num/type out of a where filter.
+
+    Returns:
+        Tuple[Dict, bool]: The constraints, and whether they are the whole filter
+    """
+    if not where:
+        return {}, True
+    clauses = where['$and'] if list(where) == ['$and'] else [{k: v} for k, v in where.items()]
+    constraints = {}
+    complete = True
+    for clause in clauses:
+        for key, condition in clause.items():
+            if isinstance(condition, dict) and list(condition) == ['$eq']:
+                condition = condition['$eq']
+            if key in ('section_num', 'type') and not isinstance(condition, (dict, list)):
+                constraints[key] = condition
+            else:
+                complete = False
+    return constraints, complete
+
+
+class NumpyCollection:
+    def __init__(self, path: str, embedding_function: Callable[[List[str]], List[List[float]]]):
+        """
+        In-process vector collection backed by a memory-mapped NumPy matrix.
+
+        Implements the subset of the Chroma collection API that QuestionVectorStore
+        uses (add, upsert, update, delete, get, query, count), so it can be swapped in
+        as a backend. Embeddings are stored L2-normalized as float32, with rows grouped
+        by (section_num, type) so a filtered search is a dot product over one
+        contiguous slice followed by argpartition.
+
+        Writes are buffered and applied in one pass before the next read, and persisted
+        immediately unless inside deferred_writes(). Opening the collection parses all
+        of records.json (only the matrix is memory-mapped), and every persist rewrites
+        the whole matrix and records file, so both cost O(N) in the collection size.
+        Reads stat records.json and reload it when another process has replaced it.
+
+        Args:
+            path (str): Directory holding the matrix and its records
+            embedding_function (Callable): Function used to embed documents and queries
+        """
+        self.path = path
+        self.embedding_function = embedding_function
+        os.makedirs(path, exist_ok=True)
+        self._records_path = os.path.join(path, 'records.json')
+
+        self._lock = threading.RLock()
+        self._defer_depth = 0
+        self._dirty = False
+        self._pending_upserts: Dict[str, Tuple[np.ndarray, Optional[str], Dict]] = {}
+        self._pending_deletes = set()
+        self._load()
+
+    def _load(self) -> None:
+        """Open the persisted matrix as a read-only memory map"""
+        ids, documents, metadatas = [], [], []
+        matrix = np.zeros((0, 0), dtype=np.float32)
+        generation = 0
+        records_stat = None
+
+        if os.path.exists(self._records_path):
+            with open(self._records_path, 'r', encoding='utf-8') as f:
+                records_stat = self._stat_records(f.fileno())
+                state = json.load(f)
+            ids = state['ids']
+            documents = state['documents']
+            metadatas = state['metadatas']
+            generation = state['generation']
+            if ids:
+                matrix = np.load(os.path.join(self.path, state['embeddings_file']), mmap_mode='r')
+
+        self._ids: List[str] = ids
+        self._documents: List[Optional[str]] = documents
+        self._metadatas: List[Dict] = metadatas
+        self._matrix = matrix
+        self._generation = generation
+        self._records_stat = records_stat
+        self._reindex()
+
+    def _stat_records(self, fd: Optional[int] = None) -> Optional[Tuple[int, int, int]]:
+        """Identity of records.json; every persist replaces the file, so it changes"""
+        try:
+            st = os.fstat(fd) if fd is not None else os.stat(self._records_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _reload_if_changed(self) -> None:
+        """Load the collection again if another process persisted since it was read"""
+        if self._pending_upserts or self._pending_deletes or self._dirty:
+            return
+        if self._stat_records() == self._records_stat:
+            return
+        try:
+            self._load()
+        except (FileNotFoundError, ValueError) as e:
+            # Persisted again while reading; the next read retries
+            print(f"Error reloading vector collection: {str(e)}")
+
+    def _reindex(self) -> None:
+        """Rebuild the id lookup and the row range of each (section_num, type) group"""
+        self._row_of = {doc_id: i for i, doc_id in enumerate(self._ids)}
+        self._ranges: Dict[Tuple, Tuple[int, int]] = {}
+        for i, metadata in enumerate(self._metadatas):
+            key = _group_key(metadata)
+            start = self._ranges[key][0] if key in self._ranges else i
+            self._ranges[key] = (start, i + 1)
+
+    def _persist(self) -> None:
+        """Write the matrix and records, swapping them in atomically"""
+        generation = self._generation + 1
+        embeddings_file = f"embeddings.{generation}.npy"
+        np.save(os.path.join(self.path, embeddings_file), np.ascontiguousarray(self._matrix, dtype=np.float32))
+
+        tmp_path = f"{self._records_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'generation': generation,
+                'embeddings_file': embeddings_file,
+                'ids': self._ids,
+                'documents': self._documents,
+                'metadatas': self._metadatas
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self._records_path)
+        self._records_stat = self._stat_records()
+
+        old_file = os.path.join(self.path, f"embeddings.{self._generation}.npy")
+        self._generation = generation
+        if os.path.exists(old_file):
+            os.remove(old_file)
+
+        # Drop the in-memory copy and go back to reading from the memory map
+        if self._ids:
+            self._matrix = np.load(os.path.join(self.path, embeddings_file), mmap_mode='r')
+        self._dirty = False
+
+    def _apply_pending(self) -> None:
+        """Fold buffered writes into the matrix in a single rebuild"""
+        if not self._pending_upserts and not self._pending_deletes:
+            return
+
+        replaced = self._pending_deletes | set(self._pending_upserts)
+        keep = [i for i, doc_id in enumerate(self._ids) if doc_id not in replaced]
+
+        ids = [self._ids[i] for i in keep] + list(self._pending_upserts)
+        documents = [self._documents[i] for i in keep] + [doc for _, doc, _ in self._pending_upserts.values()]
+        metadatas = [self._metadatas[i] for i in keep] + [meta for _, _, meta in self._pending_upserts.values()]
+
+        blocks = []
+        if keep:
+            blocks.append(np.asarray(self._matrix[keep], dtype=np.float32))
+        if self._pending_upserts:
+            blocks.append(np.stack([vector for vector, _, _ in self._pending_upserts.values()]))
+        matrix = np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+
+        # Keep each (section_num, type) group contiguous
+        order = sorted(range(len(ids)), key=lambda i: _sort_key(metadatas[i]))
+        self._ids = [ids[i] for i in order]
+        self._documents = [documents[i] for i in order]
+        self._metadatas = [metadatas[i] for i in order]
+        self._matrix = matrix[order] if len(order) else matrix
+
+        self._pending_upserts.clear()
+        self._pending_deletes.clear()
+        self._reindex()
+        self._dirty = True
+
+    def _after_write(self) -> None:
+        if not self._defer_depth:
+            self._apply_pending()
+            if self._dirty:
+                self._persist()
+
+    def _read_view(self) -> None:
+        """Make buffered writes, and other processes' persisted writes, visible before serving a read"""
+        self._reload_if_changed()
+        self._apply_pending()
+
+    @contextmanager
+    def deferred_writes(self):
+        """Buffer all writes made inside the block and persist them once on exit"""
+        with self._lock:
+            self._defer_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._defer_depth -= 1
+                if not self._defer_depth:
+                    self._after_write()
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).astype(np.float32)
+
+    def _vectors_for(self, documents: Optional[List[str]], embeddings) -> np.ndarray:
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        return self._normalize(np.asarray(embeddings, dtype=np.float32))
+
+    def _current(self, doc_id: str) -> Optional[Tuple[np.ndarray, Optional[str], Dict]]:
+        """Latest vector, document and metadata for an id, including buffered writes"""
+        if doc_id in self._pending_upserts:
+            return self._pending_upserts[doc_id]
+        if doc_id in self._pending_deletes or doc_id not in self._row_of:
+            return None
+        row = self._row_of[doc_id]
+        return np.asarray(self._matrix[row], dtype=np.float32), self._documents[row], self._metadatas[row]
+
+    def upsert(self, ids: List[str], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict]] = None, embeddings=None) -> None:
+        """Insert records, replacing any that already exist under the same ids"""
+        with self._lock:
+            vectors = self._vectors_for(documents, embeddings)
+            for i, doc_id in enumerate(ids):
+                self._pending_deletes.discard(doc_id)
+                self._pending_upserts[doc_id] = (
+                    vectors[i],
+                    documents[i] if documents else None,
+                    dict(metadatas[i]) if metadatas else {}
+                )
+            self._after_write()
+
+    def add(self, ids: List[str], documents: Optional[List[str]] = None,
+            metadatas: Optional[List[Dict]] = None, embeddings=None) -> None:
+        """Insert records, ignoring ids that already exist (as Chroma does)"""
+        with self._lock:
+            new = [i for i, doc_id in enumerate(ids) if self._current(doc_id) is None]
+            if not new:
+                return
+            self.upsert(
+                ids=[ids[i] for i in new],
+                documents=[documents[i] for i in new] if documents else None,
+                metadatas=[metadatas[i] for i in new] if metadatas else None,
+                embeddings=[embeddings[i] for i in new] if embeddings is not None else None
+            )
+
+    def update(self, ids: List[str], documents: Optional[List[str]] = None,
+               metadatas: Optional[List[Dict]] = None, embeddings=None) -> None:
+        """Update existing records; metadata is merged into what is stored"""
+        with self._lock:
+            new_vectors = None
+            if embeddings is not None or documents is not None:
+                new_vectors = self._vectors_for(documents, embeddings)
+            for i, doc_id in enumerate(ids):
+                current = self._current(doc_id)
+                if current is None:
+                    continue
+                vector, document, metadata = current
+                if new_vectors is not None:
+                    vector = new_vectors[i]
+                if documents is not None:
+                    document = documents[i]
+                if metadatas is not None:
+                    metadata = {**metadata, **metadatas[i]}
+                    metadata = {k: v for k, v in metadata.items() if v is not None}
+                self._pending_deletes.discard(doc_id)
+                self._pending_upserts[doc_id] = (vector, document, metadata)
+            self._after_write()
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None) -> None:
+        """Delete records by id and/or metadata filter"""
+        with self._lock:
+            targets = set(ids or [])
+            if where:
+                self._read_view()
+                targets |= {doc_id for doc_id, metadata in zip(self._ids, self._metadatas) if _matches(metadata, where)}
+            for doc_id in targets:
+                self._pending_upserts.pop(doc_id, None)
+                if doc_id in self._row_of:
+                    self._pending_deletes.add(doc_id)
+            self._after_write()
+
+    def count(self) -> int:
+        with self._lock:
+            self._read_view()
+            return len(self._ids)
+
+    def _candidate_rows(self, where: Optional[Dict]) -> Union[slice, np.ndarray]:
+        """Rows that satisfy the filter, as a slice when they form one contiguous group"""
+        constraints, complete = _group_constraints(where)
+        groups = [
+            row_range for (section_num, doc_type), row_range in self._ranges.items()
+            if constraints.get('section_num', section_num) == section_num
+            and constraints.get('type', doc_type) == doc_type
+        ]
+        if complete and len(groups) == 1:
+            return slice(*groups[0])
+        if complete and not where:
+            return slice(0, len(self._ids))
+
+        rows = [i for start, end in sorted(groups) for i in range(start, end)]
+        if not complete:
+            rows = [i for i in rows if _matches(self._metadatas[i], where)]
+        return np.asarray(rows, dtype=np.int64)
+
+    def _result(self, rows: List[int], include: List[str], distances: Optional[List[float]] = None) -> Dict:
+        result = {
+            'ids': [self._ids[i] for i in rows],
+            'documents': [self._documents[i] for i in rows] if 'documents' in include else None,
+            'metadatas': [self._metadatas[i] for i in rows] if 'metadatas' in include else None,
+            'embeddings': [self._matrix[i].tolist() for i in rows] if 'embeddings' in include else None
+        }
+        if distances is not None:
+            result['distances'] = distances
+        return result
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: List[str] = ("metadatas", "documents")) -> Dict:
+        """Fetch records by id and/or metadata filter"""
+        with self._lock:
+            self._read_view()
+            if ids is not None:
+                rows = [self._row_of[doc_id] for doc_id in ids if doc_id in self._row_of]
+                if where:
+                    rows = [i for i in rows if _matches(self._metadatas[i], where)]
+            else:
+                candidates = self._candidate_rows(where)
+                if isinstance(candidates, slice):
+                    rows = list(range(candidates.start, candidates.stop))
+                else:
+                    rows = candidates.tolist()
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return self._result(rows, list(include))
+
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings=None, n_results: int = 10,
+              where: Optional[Dict] = None,
+              include: List[str] = ("metadatas", "documents", "distances")) -> Dict:
+        """
+        Nearest-neighbour search over the rows matching the filter.
+
+        Distances are squared L2 between unit vectors (2 - 2 * cosine similarity),
+        the same scale as Chroma's default 'l2' space.
+        """
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+
+        with self._lock:
+            self._read_view()
+            include = list(include)
+            output = {key: [] for key in ('ids', 'documents', 'metadatas', 'embeddings', 'distances')}
+
+            candidates = self._candidate_rows(where)
+            if isinstance(candidates, slice):
+                block = self._matrix[candidates]
+                row_of = lambda i: candidates.start + int(i)
+            else:
+                block = self._matrix[candidates] if len(candidates) else np.zeros((0, queries.shape[1]), np.float32)
+                row_of = lambda i: int(candidates[i])
+
+            n_rows = block.shape[0]
+            scores = block @ queries.T if n_rows else None
+            k = min(n_results, n_rows)
+
+            for j in range(len(queries)):
+                if k == 0:
+                    rows, distances = [], []
+                else:
+                    column = scores[:, j]
+                    top = np.argpartition(-column, k - 1)[:k] if k < n_rows else np.arange(n_rows)
+                    top = top[np.argsort(-column[top])]
+                    rows = [row_of(i) for i in top]
+                    distances = np.maximum(0.0, 2.0 - 2.0 * column[top]).tolist()
+                result = self._result(rows, include, distances)
+                for key in output:
+                    output[key].append(result.get(key))
+
+            for key in ('documents', 'metadatas', 'embeddings', 'distances'):
+                if key not in include:
+                    output[key] = None
+            return output
+
+
+def copy_collection(source, target, batch_size: int = 1000) -> int:
+    """
+    Copy every record, with its stored embedding, from one collection to another.
+
+    Args:
+        source: Collection to read from (Chroma or NumpyCollection)
+        target: Collection to write to
+        batch_size (int): Records fetched and written per round trip
+
+    Returns:
+        int: Number of records copied
+    """
+    copied = 0
+    while True:
+        batch = source.get(limit=batch_size, offset=copied, include=["documents", "metadatas", "embeddings"])
+        if not batch['ids']:
+            return copied
+        target.upsert(
+            ids=batch['ids'],
+            documents=batch['documents'],
+            metadatas=batch['metadatas'],
+            embeddings=[list(map(float, vector)) for vector in batch['embeddings']]
+        )
+        copied += len(batch['ids'])
+
+
+if __name__ == "__main__":
+    import statistics
+    from backend.vector_store import QuestionVectorStore
+
+    # Compare query latency of the two backends on the same indexed data
+    chroma_store = QuestionVectorStore(backend="chroma")
+    numpy_store = QuestionVectorStore(backend="numpy")
+    with numpy_store.collection.deferred_writes():
+        copied = copy_collection(chroma_store.collection, numpy_store.collection)
+    print(f"Copied {copied} records from Chroma into the NumPy backend")
+
+    topics = ["verb conjugation", "definite articles", "prepositions with cities",
+              "plural nouns", "reflexive verbs", "past tense"]
+    query_embeddings = numpy_store.embedding_function(topics)
+    where = {"$and": [{"section_num": 1}, {"type": "question"}]}
+
+    def percentiles(samples: List[float]) -> str:
+        cuts = statistics.quantiles(samples, n=100)
+        return f"p50={cuts[49] * 1000:.3f}ms p99={cuts[98] * 1000:.3f}ms"
+
+    for name, store in (("chroma", chroma_store), ("numpy", numpy_store)):
+        search_times, query_times = [], []
+        for _ in range(50):
+            for i, topic in enumerate(topics):
+                start = time.perf_counter()
+                store.collection.query(query_embeddings=[query_embeddings[i]], n_results=6, where=where)
+                query_times.append(time.perf_counter() - start)
+
+                # Without this every pass after the first is a query cache hit
+                store.query_cache.clear()
+                start = time.perf_counter()
+                store.search_similar_questions(1, topic, 3)
+                search_times.append(time.perf_counter() - start)
+        print(f"{name:>6} vector query:          {percentiles(query_times)}")
+        print(f"{name:>6} search_similar_questions: {percentiles(search_times)}")
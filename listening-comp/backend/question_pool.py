@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+
+def normalize_topic(topic: str) -> str:
+    """Pool key for a topic, ignoring case and extra whitespace"""
+    return ' '.join(topic.lower().split())
+
+
+class QuestionPool:
+    def __init__(self, generator, topics: List[str], target_depth: int = 5, low_water: int = 2,
+                 section_num: int = 1, max_backoff: float = 60.0):
+        """
+        Keep a pool of ready, validated questions for popular topics.
+
+        A background task tops each topic's pool back up to target_depth whenever
+        it falls below low_water, so requests for these topics can be answered
+        without waiting for retrieval and Bedrock.
+
+        Args:
+            generator (RAGQuestionGenerator): Generator used to refill the pools
+            topics (List[str]): Topics to keep questions ready for
+            target_depth (int): Questions a refill tops each pool up to
+            low_water (int): Depth below which a pool is refilled
+            section_num (int): Section number the pooled questions are generated for
+            max_backoff (float): Longest wait in seconds before retrying a failing topic
+        """
+        self.generator = generator
+        self.target_depth = target_depth
+        self.low_water = low_water
+        self.section_num = section_num
+        self.max_backoff = max_backoff
+        self.pools: Dict[str, Deque[Dict]] = {normalize_topic(topic): deque() for topic in topics}
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failures = 0
+
+        now = time.monotonic()
+        self._below_since: Dict[str, Optional[float]] = {topic: now for topic in self.pools}
+        self._last_refill_lag: Dict[str, Optional[float]] = {topic: None for topic in self.pools}
+        self._backoff: Dict[str, float] = {topic: 0.0 for topic in self.pools}
+        self._retry_at: Dict[str, float] = {topic: 0.0 for topic in self.pools}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def handles(self, topic: str, section_num: int = 1) -> bool:
+        """Whether questions for this topic and section come from the pool"""
+        return section_num == self.section_num and normalize_topic(topic) in self.pools
+
+    def pop(self, topic: str) -> Optional[Dict]:
+        """Take a ready question for the topic, or None if its pool is empty"""
+        key = normalize_topic(topic)
+        pool = self.pools.get(key)
+        if not pool:
+            self.misses += 1
+            question = None
+        else:
+            self.hits += 1
+            question = pool.popleft()
+        if pool is not None and len(pool) < self.low_water:
+            if self._below_since[key] is None:
+                self._below_since[key] = time.monotonic()
+            if self._wakeup is not None:
+                self._wakeup.set()
+        return question
+
+    def start(self) -> None:
+        """Start the background refill task on the running event loop"""
+        if self._task is None and self.pools:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the background refill task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        """Refill pools below the low-water mark until cancelled"""
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            for topic, pool in self.pools.items():
+                if len(pool) < self.low_water and self._retry_at[topic] <= now:
+                    await self._refill(topic)
+
+            # Sleep until a pool drains or the next failing topic may be retried
+            pending = [at for topic, at in self._retry_at.items()
+                       if len(self.pools[topic]) < self.low_water]
+            timeout = max(0.0, min(pending) - time.monotonic()) if pending else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self, topic: str) -> None:
+        """Generate questions for one topic until its pool is back at the target depth"""
+        pool = self.pools[topic]
+        needed = self.target_depth - len(pool)
+        added = 0
+        try:
+            # Fresh generations only, so the pool never holds repeats from the response cache
+            async for _, _, question in self.generator.generate_questions(
+                [topic] * needed, self.section_num, bypass_cache=True
+            ):
+                if question is None:
+                    self.failures += 1
+                    continue
+                pool.append(question)
+                added += 1
+                self.generated += 1
+        except Exception as e:
+            print(f"Error refilling question pool for '{topic}': {str(e)}")
+
+        if len(pool) >= self.target_depth or (added and len(pool) >= self.low_water):
+            self._last_refill_lag[topic] = time.monotonic() - self._below_since[topic]
+            self._below_since[topic] = None
+        if added:
+            self._backoff[topic] = 0.0
+            self._retry_at[topic] = 0.0
+        else:
+            # Back off exponentially while a topic keeps failing
+            self._backoff[topic] = min(self.max_backoff, max(1.0, self._backoff[topic] * 2))
+            self._retry_at[topic] = time.monotonic() + self._backoff[topic]
+
+    def stats(self) -> Dict:
+        """Depth and refill lag per topic, plus hit/miss counters"""
+        now = time.monotonic()
+        total = self.hits + self.misses
+        return {
+            'running': self._task is not None and not self._task.done(),
+            'target_depth': self.target_depth,
+            'low_water': self.low_water,
+            'section_num': self.section_num,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'generated': self.generated,
+            'failures': self.failures,
+            'topics': {
+                topic: {
+                    'depth': len(pool),
+                    # Seconds the pool has been waiting for a refill, if it is below low water
+                    'refill_lag_seconds': (now - self._below_since[topic]
+                                           if self._below_since[topic] is not None else 0.0),
+                    'last_refill_lag_seconds': self._last_refill_lag[topic]
+                }
+                for topic, pool in self.pools.items()
+            }
+        }
@@ -1,14 +1,24 @@
-import json
 import os
 from typing import Dict, List, Optional
 from datetime import datetime
+from backend.sqlite_question_store import SQLiteQuestionEngine
+from backend.jsonl_question_store import JSONLQuestionEngine
+
+# Storage engine for saved questions: "sqlite" (default) or "jsonl"
+QUESTION_STORE_BACKEND = os.environ.get("QUESTION_STORE_BACKEND", "sqlite")
+# jsonl engine: longest a saved question waits for fsync (0 = fsync every insert)
+JSONL_FSYNC_INTERVAL = float(os.environ.get("JSONL_FSYNC_INTERVAL", "0.05"))
+# jsonl engine: logged questions that trigger folding the log into a snapshot
+JSONL_COMPACT_THRESHOLD = int(os.environ.get("JSONL_COMPACT_THRESHOLD", "1000"))
 
 class QuestionStore:
-    def __init__(self):
-        """Initialize the question store"""
-        self.store_dir = os.path.join(os.path.dirname(__file__), 'data', 'saved_questions')
+    def __init__(self, backend: Optional[str] = None, store_dir: Optional[str] = None):
+        """Initialize the question store with the configured storage engine"""
+        self.store_dir = store_dir or os.path.join(os.path.dirname(__file__), 'data', 'saved_questions')
         os.makedirs(self.store_dir, exist_ok=True)
+        # Written by earlier versions of the store; imported once by the engine
         self.questions_file = os.path.join(self.store_dir, 'questions.json')
+        self.backend = backend or QUESTION_STORE_BACKEND
         
         # Fallback questions to use when no generated questions are available
         self.fallback_questions = [
@@ -41,60 +51,79 @@ class QuestionStore:
                 "explanation": "We need to use the third plural person 'loro' of the present tense of the verb 'costruire'."
             }
         ]
+        self._fallback_by_id = {q['id']: q for q in self.fallback_questions}
         
-        self._load_questions()
-
-    def _load_questions(self):
-        """Load questions from file"""
-        if os.path.exists(self.questions_file):
-            with open(self.questions_file, 'r') as f:
-                self.questions = json.load(f)
+        if self.backend == "sqlite":
+            self.engine = SQLiteQuestionEngine(
+                os.path.join(self.store_dir, 'questions.sqlite3'),
+                legacy_json_path=self.questions_file
+            )
+        elif self.backend == "jsonl":
+            self.engine = JSONLQuestionEngine(
+                os.path.join(self.store_dir, 'jsonl'),
+                legacy_json_path=self.questions_file,
+                fsync_interval=JSONL_FSYNC_INTERVAL,
+                compact_threshold=JSONL_COMPACT_THRESHOLD
+            )
         else:
-            self.questions = []
-            self._save_questions()
+            raise ValueError(f"Unknown question store backend: {self.backend}")
 
-    def _save_questions(self):
-        """Save questions to file"""
-        with open(self.questions_file, 'w') as f:
-            json.dump(self.questions, f, indent=2)
-
-    def add_question(self, question: Dict) -> str:
-        """Add a new question to the store"""
-        question_id = str(len(self.questions) + 1)
-        stored_question = {
-            'id': question_id,
+    @staticmethod
+    def _record(question: Dict) -> Dict:
+        """Question as stored, with its timestamp and topic filled in"""
+        return {
             'timestamp': datetime.now().isoformat(),
             'topic': question.get('topic', 'general'),
             **question
         }
-        self.questions.append(stored_question)
-        self._save_questions()
-        return question_id
 
-    def get_questions(self, topic: Optional[str] = None) -> List[Dict]:
-        """Get all questions, optionally filtered by topic"""
-        # Start with generated questions
-        questions = self.questions.copy()  # Make a copy to avoid modifying the original list
-        
-        # Add fallback questions only if there are no generated questions
+    def add_question(self, question: Dict) -> str:
+        """Add a new question to the store"""
+        return self.engine.add([self._record(question)])[0]
+
+    def add_questions(self, questions: List[Dict]) -> List[str]:
+        """Add several questions to the store with a single write"""
         if not questions:
-            questions.extend(self.fallback_questions)
+            return []
+        return self.engine.add([self._record(question) for question in questions])
+
+    def find_question(self, question: Dict) -> Optional[str]:
+        """Id of a saved question with the same topic and content, if there is one"""
+        return self.engine.find(self._record(question))
+
+    def get_questions(self, topic: Optional[str] = None, limit: Optional[int] = None,
+                      offset: int = 0) -> List[Dict]:
+        """Get a page of questions, optionally filtered by topic"""
+        # Use fallback questions only if there are no generated questions
+        if self.engine.is_empty():
+            questions = self.fallback_questions
+            if topic:
+                questions = [q for q in questions if q.get('topic') == topic]
+            end = offset + limit if limit is not None else None
+            return questions[offset:end]
             
-        # Filter by topic if specified
-        if topic:
-            return [q for q in questions if q.get('topic') == topic]
-        return questions
+        return self.engine.list(topic, limit=limit, offset=offset)
+
+    def count_questions(self, topic: Optional[str] = None) -> int:
+        """Number of questions get_questions would return without paging"""
+        if self.engine.is_empty():
+            return len([q for q in self.fallback_questions if not topic or q.get('topic') == topic])
+        return self.engine.count(topic)
+
+    def version(self) -> int:
+        """Store version, changed by every added question; used to build ETags"""
+        return self.engine.version()
 
     def get_question(self, question_id: str) -> Optional[Dict]:
         """Get a specific question by ID"""
         # Check generated questions first
-        for question in self.questions:
-            if question['id'] == question_id:
-                return question
+        question = self.engine.get(question_id)
+        if question:
+            return question
                 
         # Then check fallback questions
-        for question in self.fallback_questions:
-            if question['id'] == question_id:
-                return question
-                
-        return None 
\ No newline at end of file
+        return self._fallback_by_id.get(question_id)
+
+    def close(self) -> None:
+        """Flush pending writes and release the storage engine"""
+        self.engine.close()
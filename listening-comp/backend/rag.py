@@ -1,30 +1,82 @@
+import asyncio
 import json
-from typing import Dict, List, Optional
-import boto3
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from backend.aws_clients import get_client
+from backend.context_builder import ContextBuilder
+from backend.instrumentation import observe, stage
+from backend.llm_cache import LLMResponseCache
+from backend.model_router import ModelRouter
+from backend.stream_parser import IncrementalJSONParser
 from backend.vector_store import QuestionVectorStore
 
+# Maximum number of Bedrock calls in flight at once across all requests
+BEDROCK_MAX_CONCURRENCY = int(os.environ.get("BEDROCK_MAX_CONCURRENCY", "10"))
+
+# Cached Bedrock responses: seconds before one expires and how many are kept
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# Prompt context: retrieved candidates to choose examples from, and the token budget for them
+RAG_CONTEXT_CANDIDATES = int(os.environ.get("RAG_CONTEXT_CANDIDATES", "8"))
+RAG_CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKEN_BUDGET", "400"))
+
+MODEL_ID = 'amazon.nova-lite-v1:0'
+
+# Model that gets a hedge request when MODEL_ID is slow, and takes over while its circuit is open
+# (set to an empty string to disable hedging)
+BEDROCK_HEDGE_MODEL_ID = os.environ.get("BEDROCK_HEDGE_MODEL_ID", "amazon.nova-micro-v1:0")
+# Seconds to wait before hedging until a model has enough latency samples for its own p95
+BEDROCK_HEDGE_DELAY = float(os.environ.get("BEDROCK_HEDGE_DELAY", "2.0"))
+# Consecutive failures that open a model's circuit, and seconds before it is tried again
+BEDROCK_CIRCUIT_FAILURES = int(os.environ.get("BEDROCK_CIRCUIT_FAILURES", "5"))
+BEDROCK_CIRCUIT_RESET = float(os.environ.get("BEDROCK_CIRCUIT_RESET", "30"))
+INFERENCE_CONFIG = {
+    "max_new_tokens": 1000
+}
+
 class RAGQuestionGenerator:
-    def __init__(self):
+    def __init__(self, vector_store: Optional[QuestionVectorStore] = None, bedrock_client=None,
+                 max_concurrency: int = BEDROCK_MAX_CONCURRENCY, llm_cache: Optional[LLMResponseCache] = None):
         """Initialize the RAG question generator with vector store and Bedrock client"""
-        self.vector_store = QuestionVectorStore()
-        self.bedrock = boto3.client('bedrock-runtime')
+        self.vector_store = vector_store or QuestionVectorStore()
+        self.llm_cache = llm_cache or LLMResponseCache(
+            os.path.join(os.path.dirname(__file__), 'data', 'llm_cache', 'responses.sqlite3'),
+            ttl_seconds=LLM_CACHE_TTL,
+            max_entries=LLM_CACHE_MAX_ENTRIES
+        )
+        models = [MODEL_ID] + ([BEDROCK_HEDGE_MODEL_ID] if BEDROCK_HEDGE_MODEL_ID else [])
+        # Every slot may have a hedge request in flight as well
+        max_calls = max_concurrency * len(models)
+        self.bedrock = bedrock_client or get_client('bedrock-runtime', max_pool_connections=max_calls)
+        
+        # The boto3 and Chroma calls are blocking, so they run in worker threads to keep
+        # the event loop free. Bedrock calls get their own bounded pool and semaphore so
+        # a burst of requests queues here instead of overloading the upstream service.
+        self._bedrock_executor = ThreadPoolExecutor(max_workers=max_calls, thread_name_prefix="bedrock")
+        self._bedrock_slots = asyncio.Semaphore(max_concurrency)
+        self.router = ModelRouter(
+            self._call_model,
+            self._bedrock_executor,
+            models,
+            hedge_delay=BEDROCK_HEDGE_DELAY,
+            failure_threshold=BEDROCK_CIRCUIT_FAILURES,
+            reset_timeout=BEDROCK_CIRCUIT_RESET
+        )
+        self.context_builder = ContextBuilder(token_budget=RAG_CONTEXT_TOKEN_BUDGET, max_examples=3)
         
-    def _get_similar_questions(self, topic: str, section_num: int = 1, n_results: int = 3) -> List[Dict]:
-        """Get similar questions from the vector store"""
-        # Limit n_results to 3 since we only need a few examples for context
-        return self.vector_store.search_similar_questions(section_num, topic, min(n_results, 3))
+    def _get_similar_questions(self, topic: str, section_num: int = 1,
+                               n_results: int = RAG_CONTEXT_CANDIDATES) -> List[Dict]:
+        """Get candidate example questions from the vector store"""
+        # Fetch more than the 3 examples we use so near-duplicates can be skipped
+        return self.vector_store.search_similar_questions(section_num, topic, n_results)
     
     def _format_context(self, similar_questions: List[Dict]) -> str:
-        """Format similar questions into context for the LLM"""
-        context = "Here are some example Italian language questions:\n\n"
-        for i, q in enumerate(similar_questions, 1):
-            context += f"Example {i}:\n"
-            context += f"Question: {q['question']}\n"
-            context += f"Options:\n"
-            for opt in q['options']:
-                context += f"- {opt}\n"
-            context += f"Answer: {q['answer']}\n"
-            context += f"Explanation: {q['explanation']}\n\n"
+        """Format the most useful of the similar questions into context for the LLM"""
+        context, _ = self.context_builder.build(similar_questions)
         return context
     
     def _generate_prompt(self, topic: str, context: str) -> str:
@@ -50,73 +102,343 @@ Format your response as a JSON object with these fields:
 
 Only respond with the JSON object, no other text."""
 
-    def _invoke_bedrock(self, prompt: str) -> Optional[str]:
-        """Invoke Bedrock with the given prompt"""
+    def _cached_response(self, prompt: str, bypass_cache: bool = False) -> Tuple[str, Optional[str]]:
+        """Return the cache key for a prompt and the cached response, if any"""
+        cache_key = LLMResponseCache.make_key(MODEL_ID, prompt, INFERENCE_CONFIG)
+        if bypass_cache:
+            self.llm_cache.record_bypass()
+            return cache_key, None
+        return cache_key, self.llm_cache.get(cache_key)
+
+    def _store_response(self, cache_key: str, generated_text: Optional[str], model_id: Optional[str]) -> None:
+        """Cache a response, but only a valid question written by the model the key is for"""
+        # Hedge and failover answers come from another model, so they are not cached as MODEL_ID's
+        if model_id != MODEL_ID:
+            return
+        if generated_text and self._parse_question(generated_text) is not None:
+            self.llm_cache.set(cache_key, generated_text)
+
+    def _request_body(self, prompt: str) -> str:
+        """Build the Nova request body for a prompt"""
+        return json.dumps({
+            "inferenceConfig": INFERENCE_CONFIG,
+            "messages": [{
+                "role": "user",
+                "content": [{
+                    "text": prompt
+                }]
+            }]
+        })
+
+    def _call_model(self, model_id: str, prompt: str) -> str:
+        """Send the prompt to one Bedrock model; errors propagate to the router"""
+        response = self.bedrock.invoke_model(
+            modelId=model_id,
+            contentType='application/json',
+            accept='application/json',
+            body=self._request_body(prompt)
+        )
+        
+        response_body = json.loads(response['body'].read())
+        return response_body['output']['message']['content'][0]['text']
+
+    async def _invoke_bedrock_async(self, prompt: str, bypass_cache: bool = False) -> Tuple[Optional[str], bool]:
+        """Invoke Bedrock in a worker thread, waiting for a free slot first; returns (text, cache hit)"""
+        # Cache hits are answered without taking a Bedrock slot; the cache is SQLite, so
+        # its reads and writes run in worker threads too. Only misses are timed as "bedrock",
+        # and waiting for a slot is timed separately as "bedrock_queue".
+        with stage("llm_cache"):
+            cache_key, cached = await asyncio.to_thread(self._cached_response, prompt, bypass_cache)
+        if cached is not None:
+            return cached, True
+        with stage("bedrock_queue"):
+            await self._bedrock_slots.acquire()
+        try:
+            with stage("bedrock"):
+                model_id, generated_text = await self.router.complete(prompt)
+        finally:
+            self._bedrock_slots.release()
+        with stage("llm_cache"):
+            await asyncio.to_thread(self._store_response, cache_key, generated_text, model_id)
+        return generated_text, False
+
+    def _stream_bedrock(self, prompt: str, on_text: Callable[[str], None], stop: threading.Event) -> str:
+        """
+        Send the prompt to Bedrock's response-stream API, passing each text delta to on_text.
+        
+        Streams are not hedged, but they go to the first model whose circuit is
+        closed and their outcome feeds the router's latency and failure tracking.
+        Returns the id of the model that was used.
+        """
+        model_id = self.router.pick_model()
+        if model_id is None:
+            raise RuntimeError("Every Bedrock model's circuit is open")
+        start = time.perf_counter()
+        received = False
         try:
-            response = self.bedrock.invoke_model(
-                modelId='amazon.nova-lite-v1:0',
+            response = self.bedrock.invoke_model_with_response_stream(
+                modelId=model_id,
                 contentType='application/json',
                 accept='application/json',
-                body=json.dumps({
-                    "inferenceConfig": {
-                        "max_new_tokens": 1000
-                    },
-                    "messages": [{
-                        "role": "user",
-                        "content": [{
-                            "text": prompt
-                        }]
-                    }]
-                })
+                body=self._request_body(prompt)
             )
+            for event in response['body']:
+                if stop.is_set():
+                    break
+                chunk = event.get('chunk')
+                if not chunk:
+                    continue
+                payload = json.loads(chunk['bytes'])
+                text = payload.get('contentBlockDelta', {}).get('delta', {}).get('text')
+                if text:
+                    received = True
+                    on_text(text)
+        except Exception:
+            self.router.record_result(model_id, time.perf_counter() - start, False)
+            raise
+        self.router.record_result(model_id, time.perf_counter() - start, received)
+        return model_id
+
+    async def _stream_text(self, prompt: str, cache_key: str, cached: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Yield the model's response to a prompt piece by piece as Bedrock streams it.
+        
+        A cached response is yielded whole. Otherwise the stream is read in a worker
+        thread while holding a Bedrock slot, and the full text is cached at the end.
+        The wait for the slot, the first text and the whole stream are timed as the
+        bedrock_queue, bedrock_first_token and bedrock stages.
+        """
+        if cached is not None:
+            yield cached
+            return
+        
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        streamed_by = []
+        
+        def produce():
+            try:
+                streamed_by.append(self._stream_bedrock(
+                    prompt, lambda text: loop.call_soon_threadsafe(queue.put_nowait, text), stop
+                ))
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+        
+        pieces = []
+        with stage("bedrock_queue"):
+            await self._bedrock_slots.acquire()
+        try:
+            stream_start = time.perf_counter()
+            loop.run_in_executor(self._bedrock_executor, produce)
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        observe("bedrock", time.perf_counter() - stream_start)
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    if not pieces:
+                        observe("bedrock_first_token", time.perf_counter() - stream_start)
+                    pieces.append(item)
+                    yield item
+            finally:
+                # Let the worker thread stop reading if the consumer went away
+                stop.set()
+        finally:
+            self._bedrock_slots.release()
+        with stage("llm_cache"):
+            await asyncio.to_thread(
+                self._store_response, cache_key, ''.join(pieces), streamed_by[0] if streamed_by else None
+            )
+
+    def _valid_field(self, field: str, value: Any) -> bool:
+        """Check one field of a generated question"""
+        if field == 'options':
+            return (isinstance(value, list) and len(value) == 3
+                    and all(isinstance(option, str) for option in value))
+        if field in ('question', 'answer', 'explanation'):
+            return isinstance(value, str) and bool(value.strip())
+        return True
+
+    def _validate_question(self, question_data: Dict) -> bool:
+        """Check that a generated question has all required fields"""
+        required_fields = ['question', 'options', 'answer', 'explanation']
+        if not all(field in question_data for field in required_fields):
+            return False
             
-            response_body = json.loads(response['body'].read())
-            return response_body['output']['message']['content'][0]['text']
-        except Exception as e:
-            print(f"Error invoking Bedrock: {str(e)}")
+        if not isinstance(question_data['options'], list) or len(question_data['options']) != 3:
+            return False
+            
+        return True
+
+    def _parse_question(self, generated_text: str) -> Optional[Dict]:
+        """Extract and validate the question JSON from the model's response"""
+        try:
+            # Find JSON block in response
+            json_start = generated_text.find('{')
+            json_end = generated_text.rfind('}') + 1
+            if json_start == -1 or json_end == 0:
+                return None
+                
+            json_str = generated_text[json_start:json_end]
+            question_data = json.loads(json_str)
+            
+            return question_data if self._validate_question(question_data) else None
+            
+        except json.JSONDecodeError:
             return None
 
-    async def generate_question(self, topic: str, section_num: int = 1) -> Optional[Dict]:
-        """Generate a new question about the given topic using RAG"""
+    async def generate_question(self, topic: str, section_num: int = 1, bypass_cache: bool = False) -> Optional[Dict]:
+        """
+        Generate a new question about the given topic using RAG, skipping cached responses if bypass_cache.
+        
+        A question answered from the response cache has 'cached' set to True, since
+        it was already handed out (and possibly saved) when it was first generated.
+        """
         try:
             # Get similar questions for context
-            similar_questions = self._get_similar_questions(topic, section_num)
+            with stage("retrieval"):
+                similar_questions = await asyncio.to_thread(self._get_similar_questions, topic, section_num)
             if not similar_questions:
                 return None
                 
             # Format context and create prompt
-            context = self._format_context(similar_questions)
-            prompt = self._generate_prompt(topic, context)
+            with stage("prompt_build"):
+                context = self._format_context(similar_questions)
+                prompt = self._generate_prompt(topic, context)
             
-            # Get response from Bedrock
-            generated_text = self._invoke_bedrock(prompt)
+            # Get response from the cache or Bedrock
+            generated_text, cached = await self._invoke_bedrock_async(prompt, bypass_cache)
             if not generated_text:
                 return None
             
-            # Extract JSON from response
-            try:
-                # Find JSON block in response
-                json_start = generated_text.find('{')
-                json_end = generated_text.rfind('}') + 1
-                if json_start == -1 or json_end == 0:
-                    return None
-                    
-                json_str = generated_text[json_start:json_end]
-                question_data = json.loads(json_str)
-                
-                # Validate required fields
-                required_fields = ['question', 'options', 'answer', 'explanation']
-                if not all(field in question_data for field in required_fields):
-                    return None
-                    
-                if not isinstance(question_data['options'], list) or len(question_data['options']) != 3:
-                    return None
-                    
-                return question_data
-                
-            except json.JSONDecodeError:
-                return None
+            with stage("parse"):
+                question = self._parse_question(generated_text)
+            if question is not None and cached:
+                question['cached'] = True
+            return question
                 
         except Exception as e:
             print(f"Error generating question: {str(e)}")
             return None
+
+    async def generate_question_stream(self, topic: str, section_num: int = 1,
+                                       bypass_cache: bool = False) -> AsyncIterator[Dict]:
+        """
+        Generate a new question about the given topic, reporting it while it is written.
+        
+        Yields events as the model's response streams in:
+        {'event': 'partial', 'field', 'value'} with the text so far of a string field,
+        {'event': 'field', 'field', 'value'} once a field is complete and valid,
+        then either {'event': 'complete', 'question', 'cached'} or {'event': 'error', 'detail'}.
+        'cached' is True when the question came from the response cache.
+        
+        Args:
+            topic (str): Topic of the question
+            section_num (int): Section number to draw example questions from
+            bypass_cache (bool): Ask Bedrock even if the response is cached
+            
+        Returns:
+            AsyncIterator[Dict]: The events described above
+        """
+        try:
+            with stage("retrieval"):
+                similar_questions = await asyncio.to_thread(self._get_similar_questions, topic, section_num)
+            if not similar_questions:
+                yield {'event': 'error', 'detail': 'No example questions found for this topic.'}
+                return
+            with stage("prompt_build"):
+                prompt = self._generate_prompt(topic, self._format_context(similar_questions))
+            
+            parser = IncrementalJSONParser()
+            with stage("llm_cache"):
+                cache_key, cached = await asyncio.to_thread(self._cached_response, prompt, bypass_cache)
+            stream = self._stream_text(prompt, cache_key, cached)
+            try:
+                async for text in stream:
+                    for kind, field, value in parser.feed(text):
+                        if kind == 'partial':
+                            yield {'event': 'partial', 'field': field, 'value': value}
+                        elif kind == 'field':
+                            if not self._valid_field(field, value):
+                                yield {'event': 'error', 'detail': f"Generated question has an invalid '{field}' field."}
+                                return
+                            yield {'event': 'field', 'field': field, 'value': value}
+            finally:
+                await stream.aclose()
+            
+            if not parser.done or not self._validate_question(parser.value):
+                yield {'event': 'error', 'detail': 'Generated question is incomplete.'}
+                return
+            yield {'event': 'complete', 'question': parser.value, 'cached': cached is not None}
+            
+        except Exception as e:
+            print(f"Error generating question: {str(e)}")
+            yield {'event': 'error', 'detail': 'Failed to generate question.'}
+
+    async def generate_questions(self, topics: List[str], section_num: int = 1,
+                                 bypass_cache: bool = False) -> AsyncIterator[Tuple[int, str, Optional[Dict]]]:
+        """
+        Generate one question per entry in topics, yielding each as soon as it is ready.
+        
+        Context is retrieved once per distinct topic in a single batched search, then
+        the Bedrock calls for every entry run concurrently (bounded by the Bedrock
+        concurrency limit). Repeating a topic asks for several questions about it; only
+        the first of them may be answered from the response cache, so the rest differ.
+        Questions answered from the cache have 'cached' set to True.
+        
+        Args:
+            topics (List[str]): Topic of each question to generate
+            section_num (int): Section number to draw example questions from
+            bypass_cache (bool): Ask Bedrock for every question, ignoring cached responses
+            
+        Returns:
+            AsyncIterator[Tuple[int, str, Optional[Dict]]]: (position in topics, topic,
+            question or None if it failed) in completion order
+        """
+        distinct_topics = list(dict.fromkeys(topics))
+        try:
+            with stage("retrieval"):
+                similar_batches = await asyncio.to_thread(
+                    self.vector_store.search_similar_questions_batch, section_num, distinct_topics, RAG_CONTEXT_CANDIDATES
+                )
+        except Exception as e:
+            print(f"Error retrieving context for batch: {str(e)}")
+            similar_batches = [[] for _ in distinct_topics]
+        with stage("prompt_build"):
+            prompts = {
+                topic: self._generate_prompt(topic, self._format_context(similar))
+                for topic, similar in zip(distinct_topics, similar_batches)
+                if similar
+            }
+        
+        first_index = {}
+        for i, topic in enumerate(topics):
+            first_index.setdefault(topic, i)
+        
+        async def generate(index: int, topic: str) -> Tuple[int, str, Optional[Dict]]:
+            if topic not in prompts:
+                return index, topic, None
+            try:
+                generated_text, cached = await self._invoke_bedrock_async(
+                    prompts[topic], bypass_cache or index != first_index[topic]
+                )
+                question = self._parse_question(generated_text) if generated_text else None
+                if question is not None and cached:
+                    question['cached'] = True
+                return index, topic, question
+            except Exception as e:
+                print(f"Error generating question: {str(e)}")
+                return index, topic, None
+        
+        tasks = [asyncio.ensure_future(generate(i, topic)) for i, topic in enumerate(topics)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Stop outstanding calls if the consumer goes away early
+            for task in tasks:
+                task.cancel()
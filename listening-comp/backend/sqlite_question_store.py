@@ -0,0 +1,173 @@
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional
+
+
+class SQLiteQuestionEngine:
+    def __init__(self, db_path: str, legacy_json_path: Optional[str] = None, busy_timeout: float = 5.0):
+        """
+        Storage engine for QuestionStore backed by a SQLite database in WAL mode.
+
+        Each insert is a single-row write, so its cost does not grow with the store,
+        and ids come from an AUTOINCREMENT key instead of the list length. On first
+        use the questions in the legacy JSON file are imported once, keeping their ids.
+
+        Several processes can share the database: writes take the write lock up
+        front (BEGIN IMMEDIATE) and wait up to busy_timeout for it, and WAL lets
+        reads run alongside them.
+
+        Args:
+            db_path (str): Path to the SQLite database file
+            legacy_json_path (Optional[str]): questions.json written by the old store, if any
+            busy_timeout (float): Seconds to wait for another process's write lock
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # Autocommit mode, so transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, topic TEXT NOT NULL, data TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS questions_topic ON questions (topic, id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        if legacy_json_path:
+            self._import_json(legacy_json_path)
+
+    @contextlib.contextmanager
+    def _write_transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a block as one write transaction, holding the database write lock from the start"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _import_json(self, json_path: str) -> None:
+        """Copy the questions from the legacy JSON file, once across all processes"""
+        with self._write_transaction() as conn:
+            done = conn.execute("SELECT value FROM meta WHERE key = 'json_import'").fetchone()
+            if done:
+                return
+            questions = []
+            if os.path.exists(json_path):
+                with open(json_path, 'r') as f:
+                    questions = json.load(f)
+
+            rows = []
+            for question in questions:
+                data = {key: value for key, value in question.items() if key not in ('id', 'timestamp', 'topic')}
+                question_id = str(question.get('id', ''))
+                rows.append((
+                    int(question_id) if question_id.isdigit() else None,
+                    question.get('timestamp', ''),
+                    question.get('topic', 'general'),
+                    json.dumps(data, ensure_ascii=False)
+                ))
+            conn.executemany(
+                "INSERT OR IGNORE INTO questions (id, timestamp, topic, data) VALUES (?, ?, ?, ?)", rows
+            )
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('json_import', ?)", (str(len(rows)),)
+            )
+            if rows:
+                print(f"Imported {len(rows)} questions from {json_path}")
+
+    @staticmethod
+    def _row_to_question(row) -> Dict:
+        """Rebuild a stored question from its row"""
+        question_id, timestamp, topic, data = row
+        return {'id': str(question_id), 'timestamp': timestamp, 'topic': topic, **json.loads(data)}
+
+    def add(self, records: List[Dict]) -> List[str]:
+        """
+        Insert questions in one transaction.
+
+        Args:
+            records (List[Dict]): Questions with 'timestamp' and 'topic' set
+
+        Returns:
+            List[str]: The new question ids, in input order
+        """
+        question_ids = []
+        with self._write_transaction() as conn:
+            for record in records:
+                data = {key: value for key, value in record.items() if key not in ('timestamp', 'topic')}
+                cursor = conn.execute(
+                    "INSERT INTO questions (timestamp, topic, data) VALUES (?, ?, ?)",
+                    (record['timestamp'], record['topic'], json.dumps(data, ensure_ascii=False))
+                )
+                question_ids.append(str(cursor.lastrowid))
+        return question_ids
+
+    def get(self, question_id: str) -> Optional[Dict]:
+        """Look up one question by id"""
+        if not question_id.isdigit():
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, timestamp, topic, data FROM questions WHERE id = ?", (int(question_id),)
+            ).fetchone()
+        return self._row_to_question(row) if row else None
+
+    def find(self, record: Dict) -> Optional[str]:
+        """Id of the first stored question with the same topic and content as the record"""
+        # Serialized exactly as add() does, so equal questions have equal data
+        data = {key: value for key, value in record.items() if key not in ('timestamp', 'topic')}
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM questions WHERE topic = ? AND data = ? ORDER BY id LIMIT 1",
+                (record['topic'], json.dumps(data, ensure_ascii=False))
+            ).fetchone()
+        return str(row[0]) if row else None
+
+    def list(self, topic: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """A page of questions in id order, optionally only those with the given topic"""
+        # LIMIT -1 means no limit in SQLite
+        page = (-1 if limit is None else limit, offset)
+        with self._lock:
+            if topic:
+                rows = self._conn.execute(
+                    "SELECT id, timestamp, topic, data FROM questions WHERE topic = ? ORDER BY id LIMIT ? OFFSET ?",
+                    (topic, *page)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT id, timestamp, topic, data FROM questions ORDER BY id LIMIT ? OFFSET ?", page
+                ).fetchall()
+        return [self._row_to_question(row) for row in rows]
+
+    def count(self, topic: Optional[str] = None) -> int:
+        """Number of stored questions, optionally only those with the given topic"""
+        with self._lock:
+            if topic:
+                return self._conn.execute("SELECT COUNT(*) FROM questions WHERE topic = ?", (topic,)).fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+    def is_empty(self) -> bool:
+        """Whether no questions are stored, without counting them"""
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM questions LIMIT 1").fetchone() is None
+
+    def version(self) -> int:
+        """Counter that changes whenever a question is added, by any process"""
+        with self._lock:
+            # AUTOINCREMENT's high-water mark, kept by SQLite itself
+            row = self._conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'questions'").fetchone()
+        return row[0] if row else 0
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            self._conn.close()
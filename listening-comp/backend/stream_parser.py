@@ -0,0 +1,142 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+WHITESPACE = ' \t\r\n'
+
+
+class IncrementalJSONParser:
+    def __init__(self):
+        """
+        Parser for a JSON object that arrives in pieces, e.g. streamed LLM output.
+
+        Text before the opening brace is ignored. As chunks are fed in, the parser
+        reports each top-level field as soon as its value is complete, and the text
+        of a top-level string value while it is still being written, without waiting
+        for the rest of the object.
+        """
+        self.done = False
+        self.value: Optional[Dict] = None
+        self._buffer = ''
+        self._pos = 0             # next character of _buffer to scan
+        self._start = None        # offset of the object's opening brace
+        self._expect = 'key'      # key, colon, value or separator
+        self._key = None
+        self._token_start = None  # offset where the current key or value began
+        self._in_string = False
+        self._escaped = False
+        self._nesting = 0         # bracket depth inside the current value
+        self._last_partial = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Optional[str], Any]]:
+        """
+        Consume the next piece of text.
+
+        Args:
+            chunk (str): Text following everything fed so far
+
+        Returns:
+            List[Tuple[str, Optional[str], Any]]: Events in order, each one of
+            ('partial', key, text so far), ('field', key, value) or ('done', None, object)
+
+        Raises:
+            ValueError: If the text is not a well-formed JSON object
+        """
+        if self.done:
+            return []
+        self._buffer += chunk
+        events = []
+        while self._pos < len(self._buffer) and not self.done:
+            char = self._buffer[self._pos]
+            if self._start is None:
+                if char == '{':
+                    self._start = self._pos
+            elif self._token_start is not None:
+                self._scan_token(char, events)
+            else:
+                self._scan_structure(char, events)
+            self._pos += 1
+
+        # Report the top-level string value being written, if any
+        if (not self.done and self._expect == 'value' and self._token_start is not None
+                and self._nesting == 0 and self._buffer[self._token_start] == '"' and self._in_string):
+            try:
+                text = json.loads(self._buffer[self._token_start:self._pos] + '"')
+            except ValueError:
+                text = None  # cut off in the middle of an escape sequence
+            if text is not None and text != self._last_partial:
+                self._last_partial = text
+                events.append(('partial', self._key, text))
+        return events
+
+    def _scan_structure(self, char: str, events: List) -> None:
+        """Handle a character between keys and values of the top-level object"""
+        if char in WHITESPACE:
+            return
+        if self._expect == 'key' and char == '"':
+            self._begin_token(self._pos, in_string=True)
+        elif self._expect == 'key' and char == '}' and self._key is None:
+            self._finish(events)  # empty object
+        elif self._expect == 'colon' and char == ':':
+            self._expect = 'value'
+        elif self._expect == 'value':
+            self._begin_token(self._pos, in_string=char == '"')
+            if char in '[{':
+                self._nesting = 1
+        elif self._expect == 'separator' and char == ',':
+            self._expect = 'key'
+        elif self._expect == 'separator' and char == '}':
+            self._finish(events)
+        else:
+            raise ValueError(f"Unexpected {char!r} at offset {self._pos - self._start}")
+
+    def _scan_token(self, char: str, events: List) -> None:
+        """Handle a character inside the current key or value"""
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == '\\':
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                if self._nesting == 0:
+                    self._end_token(self._pos + 1, events)
+            return
+
+        if self._nesting == 0:
+            # A number, true, false or null ends at the first delimiter
+            if char in WHITESPACE or char in ',}':
+                self._end_token(self._pos, events)
+                self._scan_structure(char, events)
+        elif char == '"':
+            self._in_string = True
+        elif char in '[{':
+            self._nesting += 1
+        elif char in ']}':
+            self._nesting -= 1
+            if self._nesting == 0:
+                self._end_token(self._pos + 1, events)
+
+    def _begin_token(self, offset: int, in_string: bool) -> None:
+        """Start collecting a key or value at the given offset"""
+        self._token_start = offset
+        self._in_string = in_string
+        self._escaped = False
+        self._nesting = 0
+
+    def _end_token(self, end: int, events: List) -> None:
+        """Decode the finished key or value ending just before end"""
+        token = json.loads(self._buffer[self._token_start:end])
+        self._token_start = None
+        if self._expect == 'key':
+            self._key = token
+            self._expect = 'colon'
+        else:
+            events.append(('field', self._key, token))
+            self._expect = 'separator'
+            self._last_partial = None
+
+    def _finish(self, events: List) -> None:
+        """Decode the whole object once its closing brace arrives"""
+        self.value = json.loads(self._buffer[self._start:self._pos + 1])
+        self.done = True
+        events.append(('done', None, self.value))
@@ -1,9 +1,9 @@
-import boto3
 from typing import List, Dict, Optional
 import json
 import os
 import re
 from config import *  # Import AWS configuration
+from aws_clients import get_client
 
 # Define base paths
 BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -13,7 +13,7 @@ STRUCTURED_DATA_DIR = os.path.join(DATA_DIR, "structured_data")
 
 class ListeningTestExtractor:
     def __init__(self):
-        self.bedrock = boto3.client('bedrock-runtime')
+        self.bedrock = get_client('bedrock-runtime')
         # Create output directory if it doesn't exist
         os.makedirs(STRUCTURED_DATA_DIR, exist_ok=True)
         
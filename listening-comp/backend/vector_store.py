@@ -1,31 +1,148 @@
 import os
-from typing import List, Dict, Optional
+import hashlib
+import time
+import contextlib
+import copy
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from typing import Iterator, List, Dict, Optional, Tuple
 import chromadb
 from chromadb.config import Settings
+from chromadb.utils import embedding_functions
 import json
 import re
+from backend.embedding_cache import EmbeddingCache
+from backend.instrumentation import stage
+from backend.numpy_vector_backend import NumpyCollection
+from backend.ttl_cache import TTLCache
+
+# Name of the model behind Chroma's default embedding function; part of the embedding cache key
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Vector backend to use: "chroma" (default) or "numpy" for the in-process memory-mapped backend
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+
+# Storage layout for new writes: "legacy" embeds the question, answer and explanation as
+# three documents; "compact" embeds only the question and keeps the rest as metadata
+VECTOR_LAYOUT = os.environ.get("VECTOR_LAYOUT", "legacy")
+
+# Size and lifetime of the search_similar_questions result cache
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "256"))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "300"))
+
+def parse_questions_file(file_path: str) -> Dict:
+    """
+    Parse and validate questions from a JSON file.
+    
+    Args:
+        file_path (str): Path to the JSON file
+        
+    Returns:
+        Dict: Parsed data containing introduction and questions
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+        
+    # Validate required structure
+    if not isinstance(data, dict) or 'questions' not in data:
+        raise ValueError("Invalid JSON format: must contain 'questions' array")
+        
+    # Ensure questions have required fields
+    for q in data.get('questions', []):
+        required_fields = ['number', 'question', 'options', 'answer', 'explanation']
+        if not all(field in q for field in required_fields):
+            raise ValueError(f"Question missing required fields: {required_fields}")
+        
+        if not isinstance(q['options'], list) or len(q['options']) != 3:
+            raise ValueError("Each question must have exactly 3 options")
+    
+    return data
+
+def _parse_source_file(file_path: str) -> Dict:
+    """
+    Read, hash and parse one source file. Runs in the bulk ingestion process pool,
+    so errors are returned rather than raised.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            file_hash = hashlib.sha256(f.read()).hexdigest()
+        return {
+            'file_path': file_path,
+            'mtime': os.path.getmtime(file_path),
+            'sha256': file_hash,
+            'data': parse_questions_file(file_path)
+        }
+    except Exception as e:
+        return {'file_path': file_path, 'error': str(e)}
 
 class QuestionVectorStore:
-    def __init__(self, collection_name: str = "italian_lessons"):
+    def __init__(self, collection_name: str = "italian_lessons", backend: Optional[str] = None,
+                 layout: Optional[str] = None, data_dir: Optional[str] = None,
+                 embedding_function=None, embedding_model_name: Optional[str] = None):
         """
         Initialize a vector database for storing and searching Italian lesson questions.
-        Uses ChromaDB as the underlying vector store, which:
+        Uses ChromaDB as the underlying vector store by default, which:
         1. Converts text into vector embeddings
         2. Stores these embeddings in a persistent database
         3. Enables semantic search across the embeddings
         
+        The "numpy" backend keeps the same API but stores normalized embeddings in
+        a memory-mapped matrix and searches it in-process.
+        
         Args:
             collection_name (str): Name of the vector database collection
+            backend (Optional[str]): "chroma" or "numpy"; defaults to the VECTOR_BACKEND setting
+            layout (Optional[str]): "legacy" or "compact" layout for new writes; defaults to
+                the VECTOR_LAYOUT setting. Reads understand both layouts.
+            data_dir (Optional[str]): Data directory to use instead of backend/data
+            embedding_function: Embedding function to use instead of Chroma's default model
+            embedding_model_name (Optional[str]): Name of that model, used in the embedding cache key
         """
+        self.backend = backend or VECTOR_BACKEND
+        if self.backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown vector backend: {self.backend}")
+        self.layout = layout or VECTOR_LAYOUT
+        if self.layout not in ("legacy", "compact"):
+            raise ValueError(f"Unknown vector layout: {self.layout}")
+        
         # Set up paths
         self.backend_dir = os.path.dirname(os.path.abspath(__file__))
-        self.data_dir = os.path.join(self.backend_dir, "data")
+        self.data_dir = data_dir or os.path.join(self.backend_dir, "data")
         self.structured_data_dir = os.path.join(self.data_dir, "structured_data")
         self.vector_db_dir = os.path.join(self.data_dir, "vector_db")
         
         # Create vector database directory
         os.makedirs(self.vector_db_dir, exist_ok=True)
         
+        # Embeddings are computed here rather than inside Chroma so they can be cached
+        if embedding_function is None:
+            embedding_function = embedding_functions.DefaultEmbeddingFunction()
+            embedding_model_name = EMBEDDING_MODEL_NAME
+        self.embedding_function = embedding_function
+        self.embedding_cache = EmbeddingCache(
+            os.path.join(self.data_dir, "embedding_cache", "embeddings.sqlite3"),
+            embedding_model_name or type(embedding_function).__name__
+        )
+        
+        # Record of which source files (and which questions in them) are indexed
+        manifest_name = collection_name if self.backend == "chroma" else f"{collection_name}_{self.backend}"
+        self.manifest_path = os.path.join(self.vector_db_dir, f"{manifest_name}_manifest.json")
+        self.manifest = self._load_manifest()
+        self._manifest_deferred = False
+        
+        # Repeated searches are served from memory until the collection is written to.
+        # Writes from other processes (e.g. the indexer script) are only picked up once
+        # entries expire, so the TTL bounds how stale a result can be.
+        self.query_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+        self._write_generation = 0
+        
+        if self.backend == "numpy":
+            numpy_dir = os.path.join(self.vector_db_dir, "numpy", collection_name)
+            self.client = None
+            self.collection = NumpyCollection(numpy_dir, self.embedding_function)
+            print(f"NumPy vector backend initialized at: {numpy_dir}")
+            return
+        
         # Initialize the vector database with ChromaDB
         try:
             self.client = chromadb.PersistentClient(
@@ -39,9 +156,108 @@ class QuestionVectorStore:
         # Get or create a collection in the vector database
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
-            metadata={"description": "Vector embeddings of Italian lesson questions for semantic search"}
+            metadata={"description": "Vector embeddings of Italian lesson questions for semantic search"},
+            embedding_function=self.embedding_function
         )
     
+    @contextlib.contextmanager
+    def _deferred_writes(self):
+        """
+        Batch collection writes into one persist where the backend supports it.
+        The manifest is held back until the data it describes has been persisted.
+        Nested blocks are folded into the outermost one.
+        """
+        if not isinstance(self.collection, NumpyCollection) or self._manifest_deferred:
+            yield
+            return
+        self._manifest_deferred = True
+        try:
+            with self.collection.deferred_writes():
+                yield
+        finally:
+            self._manifest_deferred = False
+            self._save_manifest()
+    
+    def _load_manifest(self) -> Dict:
+        """Load the manifest of indexed source files"""
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'files': {}}
+    
+    def _save_manifest(self) -> None:
+        """Write the manifest atomically so an interrupted run never leaves it half-written"""
+        if self._manifest_deferred:
+            return
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+    
+    @staticmethod
+    def _hash_question(question: Dict) -> str:
+        """Hash the content of a question so edits can be detected"""
+        return hashlib.sha256(json.dumps(question, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def _manifest_key(self, file_path: str) -> str:
+        """Key a source file by its path relative to the structured data directory"""
+        return os.path.relpath(os.path.abspath(file_path), self.structured_data_dir)
+    
+    def _diff_questions(self, entry: Optional[Dict], questions: List[Dict], video_id: str,
+                        section_num: int) -> Tuple[Dict[str, str], List[Dict], List[str]]:
+        """
+        Compare a file's questions against its manifest entry.
+        
+        Returns:
+            Tuple[Dict[str, str], List[Dict], List[str]]: Content hash per question ID,
+            questions that are new or edited, and IDs of questions that were removed
+        """
+        indexed_hashes = entry['questions'] if entry else {}
+        question_hashes = {}
+        changed_questions = []
+        for q in questions:
+            question_id = f"{video_id}_s{section_num}_q{q['number']}"
+            question_hashes[question_id] = self._hash_question(q)
+            if indexed_hashes.get(question_id) != question_hashes[question_id]:
+                changed_questions.append(q)
+        removed_ids = [qid for qid in indexed_hashes if qid not in question_hashes]
+        return question_hashes, changed_questions, removed_ids
+    
+    def _remove_missing_files(self, directory: str, seen: set) -> int:
+        """Delete questions from manifest files in the directory that no longer exist"""
+        directory = os.path.abspath(directory)
+        removed = 0
+        for key in list(self.manifest['files']):
+            file_path = os.path.normpath(os.path.join(self.structured_data_dir, key))
+            if os.path.dirname(file_path) == directory and key not in seen:
+                self.delete_questions(list(self.manifest['files'][key]['questions']))
+                del self.manifest['files'][key]
+                removed += 1
+        if removed:
+            self._save_manifest()
+        return removed
+    
+    def _invalidate_query_cache(self) -> None:
+        """Forget cached search results after any write to the collection"""
+        self._write_generation += 1
+        self.query_cache.clear()
+    
+    def delete_questions(self, question_ids: List[str]) -> None:
+        """
+        Remove questions and their answer/explanation vectors from the database.
+        
+        Args:
+            question_ids (List[str]): Unique question IDs to remove
+        """
+        if not question_ids:
+            return
+        ids = []
+        for question_id in question_ids:
+            ids.extend([f"{question_id}_q", f"{question_id}_a", f"{question_id}_e"])
+        self.collection.delete(ids=ids)
+        self._invalidate_query_cache()
+        print(f"Deleted {len(question_ids)} questions from the vector database")
+    
     def parse_questions_from_file(self, file_path: str) -> Dict:
         """
         Parse questions from a JSON file.
@@ -52,23 +268,7 @@ class QuestionVectorStore:
         Returns:
             Dict: Parsed data containing introduction and questions
         """
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            
-        # Validate required structure
-        if not isinstance(data, dict) or 'questions' not in data:
-            raise ValueError("Invalid JSON format: must contain 'questions' array")
-            
-        # Ensure questions have required fields
-        for q in data.get('questions', []):
-            required_fields = ['number', 'question', 'options', 'answer', 'explanation']
-            if not all(field in q for field in required_fields):
-                raise ValueError(f"Question missing required fields: {required_fields}")
-            
-            if not isinstance(q['options'], list) or len(q['options']) != 3:
-                raise ValueError("Each question must have exactly 3 options")
-        
-        return data
+        return parse_questions_file(file_path)
     
     def save_questions_to_json(self, questions: List[Dict], video_id: str, section_num: int) -> str:
         """
@@ -99,10 +299,95 @@ class QuestionVectorStore:
             
         return output_path
     
+    def _build_records(self, section_num: int, questions: List[Dict], video_id: str) -> Tuple[List[str], List[str], List[Dict]]:
+        """
+        Build the documents, metadata and IDs that represent questions in the database.
+        
+        The legacy layout stores three embedded documents per question (question,
+        answer, explanation). The compact layout stores only the question document
+        and carries the answer and explanation in its metadata.
+        
+        Args:
+            section_num (int): Section number for the questions
+            questions (List[Dict]): List of question dictionaries
+            video_id (str): Video ID these questions belong to
+            
+        Returns:
+            Tuple[List[str], List[str], List[Dict]]: IDs, documents and metadatas
+        """
+        documents = []  # Text to be embedded
+        metadatas = []  # Metadata for each embedding
+        ids = []       # Unique IDs for each embedding
+        
+        # Add questions, answers, and explanations to vector database
+        for q in questions:
+            # Generate unique question ID
+            question_id = f"{video_id}_s{section_num}_q{q['number']}"
+            
+            # Create a rich text representation for better semantic search
+            search_text = f"Question: {q['question']}\nExplanation: {q['explanation']}"
+            documents.append(search_text)
+            metadata = {
+                'type': 'question',
+                'number': q['number'],
+                'section_num': section_num,
+                'video_id': video_id,
+                'question_id': question_id,
+                'options': ','.join(q['options'])
+            }
+            ids.append(f"{question_id}_q")
+            
+            if self.layout == "compact":
+                metadata['answer'] = q['answer']
+                metadata['explanation'] = q['explanation']
+                metadatas.append(metadata)
+                continue
+            metadatas.append(metadata)
+            
+            # Add answer embedding
+            documents.append(q['answer'])
+            metadatas.append({
+                'type': 'answer',
+                'number': q['number'],
+                'section_num': section_num,
+                'video_id': video_id,
+                'question_id': question_id
+            })
+            ids.append(f"{question_id}_a")
+            
+            # Add explanation embedding
+            documents.append(q['explanation'])
+            metadatas.append({
+                'type': 'explanation',
+                'number': q['number'],
+                'section_num': section_num,
+                'video_id': video_id,
+                'question_id': question_id
+            })
+            ids.append(f"{question_id}_e")
+        
+        return ids, documents, metadatas
+    
+    def _write_records(self, ids: List[str], documents: List[str], metadatas: List[Dict]) -> None:
+        """Embed documents (reusing cached vectors) and upsert them in one call"""
+        embeddings = self.embedding_cache.embed(documents, self.embedding_function)
+        self.collection.upsert(
+            documents=documents,    # Text the vectors were computed from
+            embeddings=embeddings,  # Vector for each document
+            metadatas=metadatas,    # Metadata for each vector
+            ids=ids                 # Unique IDs for each vector
+        )
+        # Legacy answer/explanation vectors of rewritten questions are only cleaned
+        # up by migrate_to_compact; reads prefer the metadata on the question entry
+        self._invalidate_query_cache()
+    
     def add_questions(self, section_num: int, questions: List[Dict], video_id: str) -> bool:
         """
         Add questions to the vector database.
         
+        Questions that are already stored under the same IDs are overwritten,
+        so adding the same questions twice is safe.
+        
         Args:
             section_num (int): Section number for the questions
             questions (List[Dict]): List of question dictionaries
@@ -112,57 +397,11 @@ class QuestionVectorStore:
             bool: True if questions were added successfully
         """
         try:
-            documents = []  # Text to be embedded
-            metadatas = []  # Metadata for each embedding
-            ids = []       # Unique IDs for each embedding
-            
-            # Add questions, answers, and explanations to vector database
-            for q in questions:
-                # Generate unique question ID
-                question_id = f"{video_id}_s{section_num}_q{q['number']}"
-                
-                # Create a rich text representation for better semantic search
-                search_text = f"Question: {q['question']}\nExplanation: {q['explanation']}"
-                documents.append(search_text)
-                metadatas.append({
-                    'type': 'question',
-                    'number': q['number'],
-                    'section_num': section_num,
-                    'video_id': video_id,
-                    'question_id': question_id,
-                    'options': ','.join(q['options'])
-                })
-                ids.append(f"{question_id}_q")
-                
-                # Add answer embedding
-                documents.append(q['answer'])
-                metadatas.append({
-                    'type': 'answer',
-                    'number': q['number'],
-                    'section_num': section_num,
-                    'video_id': video_id,
-                    'question_id': question_id
-                })
-                ids.append(f"{question_id}_a")
-                
-                # Add explanation embedding
-                documents.append(q['explanation'])
-                metadatas.append({
-                    'type': 'explanation',
-                    'number': q['number'],
-                    'section_num': section_num,
-                    'video_id': video_id,
-                    'question_id': question_id
-                })
-                ids.append(f"{question_id}_e")
+            ids, documents, metadatas = self._build_records(section_num, questions, video_id)
             
             # Add all documents to the vector database
             if documents:
-                self.collection.add(
-                    documents=documents,  # Text to be converted to vectors
-                    metadatas=metadatas,  # Metadata for each vector
-                    ids=ids              # Unique IDs for each vector
-                )
+                self._write_records(ids, documents, metadatas)
                 print(f"Added {len(documents)} vector embeddings for section {section_num}")
                 return True
             else:
@@ -173,6 +412,66 @@ class QuestionVectorStore:
             print(f"Error adding questions: {str(e)}")
             return False
     
+    @staticmethod
+    def _extract_question_text(document: str) -> str:
+        """Pull the bare question text out of a stored 'Question: ...' document"""
+        return document.split('Question: ')[1].split('\n')[0]
+    
+    def _hydrate_questions(self, question_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Fetch the question, answer and explanation records for a set of questions.
+        
+        Works with both storage layouts. All records are looked up by key in a single collection.get() round trip,
+        so the cost stays flat no matter how many questions are hydrated.
+        
+        Args:
+            question_ids (List[str]): Unique question IDs to hydrate
+            
+        Returns:
+            Dict[str, Dict]: Question data keyed by question ID; IDs that are not
+            in the collection are left out
+        """
+        question_ids = list(dict.fromkeys(question_ids))
+        if not question_ids:
+            return {}
+        
+        ids = []
+        for question_id in question_ids:
+            ids.extend([f"{question_id}_q", f"{question_id}_a", f"{question_id}_e"])
+        
+        results = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        records = {
+            doc_id: (results['documents'][i], results['metadatas'][i])
+            for i, doc_id in enumerate(results['ids'])
+        }
+        
+        hydrated = {}
+        for question_id in question_ids:
+            if f"{question_id}_q" not in records:
+                continue
+            document, metadata = records[f"{question_id}_q"]
+            if 'answer' in metadata:
+                # Compact layout keeps everything on the question entry
+                answer = metadata['answer']
+                explanation = metadata.get('explanation', '')
+            else:
+                answer_record = records.get(f"{question_id}_a")
+                explanation_record = records.get(f"{question_id}_e")
+                answer = answer_record[0] if answer_record else ''
+                explanation = explanation_record[0] if explanation_record else ''
+            
+            hydrated[question_id] = {
+                'question_id': question_id,
+                'section_num': metadata['section_num'],
+                'number': metadata['number'],
+                'video_id': metadata['video_id'],
+                'question': self._extract_question_text(document),
+                'options': metadata['options'].split(','),
+                'answer': answer,
+                'explanation': explanation
+            }
+        return hydrated
+    
     def get_question_by_id(self, section_num: int, question_id: str) -> Optional[Dict]:
         """
         Retrieve a specific question by its ID and section number.
@@ -185,56 +484,20 @@ class QuestionVectorStore:
             Optional[Dict]: Question data if found, None otherwise
         """
         try:
-            # Query the vector database for the question
-            results = self.collection.query(
-                query_texts=[""],  # Empty query to get exact matches
-                where={"$and": [
-                    {"section_num": section_num},
-                    {"question_id": question_id},
-                    {"type": "question"}
-                ]}
-            )
-            
-            if not results['documents'][0]:
+            question_data = self._hydrate_questions([question_id]).get(question_id)
+            if not question_data or question_data['section_num'] != section_num:
                 return None
-            
-            # Get metadata from the matched question
-            metadata = results['metadatas'][0][0]
-            options = metadata['options'].split(',')
-            
-            # Query for answer and explanation
-            answer_results = self.collection.query(
-                query_texts=[""],
-                where={"$and": [
-                    {"question_id": question_id},
-                    {"type": "answer"}
-                ]}
-            )
-            
-            explanation_results = self.collection.query(
-                query_texts=[""],
-                where={"$and": [
-                    {"question_id": question_id},
-                    {"type": "explanation"}
-                ]}
-            )
-            
-            # Combine all components
-            return {
-                'question_id': question_id,
-                'section_num': section_num,
-                'number': metadata['number'],
-                'video_id': metadata['video_id'],
-                'question': results['documents'][0][0].split('Question: ')[1].split('\n')[0],
-                'options': options,
-                'answer': answer_results['documents'][0][0] if answer_results['documents'][0] else '',
-                'explanation': explanation_results['documents'][0][0] if explanation_results['documents'][0] else ''
-            }
+            return question_data
             
         except Exception as e:
             print(f"Error getting question {question_id}: {str(e)}")
             return None
     
+    def _cache_search_results(self, cache_key: tuple, generation: int, results: List[Dict]) -> None:
+        """Cache search results unless the collection was written to while they were computed"""
+        if generation == self._write_generation:
+            self.query_cache.set(cache_key, copy.deepcopy(results))
+    
     def search_similar_questions(self, section_num: int, query: str, n_results: int = 5) -> List[Dict]:
         """
         Search for questions semantically similar to the query within a section.
@@ -247,64 +510,117 @@ class QuestionVectorStore:
         Returns:
             List[Dict]: List of matching questions with their similarity scores
         """
-        try:
-            # Query the vector database
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results * 2,  # Get more results initially for filtering
-                where={"$and": [
-                    {"section_num": section_num},
-                    {"type": "question"}
-                ]}
-            )
+        return self.search_similar_questions_batch(section_num, [query], n_results)[0]
+    
+    def search_similar_questions_batch(self, section_num: int, queries: List[str], n_results: int = 5) -> List[List[Dict]]:
+        """
+        Search for questions similar to each of several queries within a section.
+        
+        Queries not already cached are embedded and searched in a single
+        collection.query() call, and all of their hits are hydrated together.
+        
+        Args:
+            section_num (int): Section number to search in
+            queries (List[str]): The search queries
+            n_results (int): Maximum number of results to return per query
             
-            if not results['documents'][0]:
-                print("No matching questions found")
-                return []
+        Returns:
+            List[List[Dict]]: Matching questions with similarity scores, one list per query
+        """
+        # Serve repeated searches from the cache
+        batch_results: List[Optional[List[Dict]]] = [None] * len(queries)
+        misses = {}  # cache key -> positions in queries
+        with stage("query_cache"):
+            for i, query in enumerate(queries):
+                cache_key = (section_num, ' '.join(query.lower().split()), n_results)
+                cached = self.query_cache.get(cache_key)
+                if cached is not None:
+                    batch_results[i] = copy.deepcopy(cached)
+                else:
+                    misses.setdefault(cache_key, []).append(i)
+        if not misses:
+            return batch_results
+        generation = self._write_generation
+        
+        try:
+            # Query the vector database once for every uncached query
+            miss_keys = list(misses)
+            with stage("query_embedding"):
+                query_embeddings = self.embedding_function([queries[misses[key][0]] for key in miss_keys])
+            with stage("vector_search"):
+                results = self.collection.query(
+                    query_embeddings=query_embeddings,
+                    n_results=n_results * 2,  # Get more results initially for filtering
+                    where={"$and": [
+                        {"section_num": section_num},
+                        {"type": "question"}
+                    ]}
+                )
             
-            formatted_results = []
-            for i, doc in enumerate(results['documents'][0]):
-                metadata = results['metadatas'][0][i]
-                distance = float(results['distances'][0][i])
-                
-                # Calculate similarity score (0 to 1)
-                if distance > 2.0:  # Too dissimilar
-                    continue
+            # Keep hits that are similar enough to be useful
+            hits_per_query = []
+            for q in range(len(miss_keys)):
+                hits = []
+                for i, metadata in enumerate(results['metadatas'][q]):
+                    distance = float(results['distances'][q][i])
+                    
+                    # Calculate similarity score (0 to 1)
+                    if distance > 2.0:  # Too dissimilar
+                        continue
+                        
+                    similarity = max(0, min(1, 1 - (distance / 2.0)))
+                    if similarity < 0.1:  # Filter out low similarity results
+                        continue
                     
-                similarity = max(0, min(1, 1 - (distance / 2.0)))
-                if similarity < 0.1:  # Filter out low similarity results
-                    continue
+                    hits.append((metadata, similarity))
+                hits_per_query.append(hits)
+            
+            # Get full question data for every hit of every query in one round trip
+            with stage("hydration"):
+                hydrated = self._hydrate_questions([
+                    metadata['question_id'] for hits in hits_per_query for metadata, _ in hits
+                ])
+            
+            for cache_key, hits in zip(miss_keys, hits_per_query):
+                if not hits:
+                    print("No matching questions found")
                 
-                # Get full question data
-                question_data = self.get_question_by_id(
-                    section_num,
-                    metadata['question_id']
-                )
+                formatted_results = []
+                for metadata, similarity in hits:
+                    question_data = hydrated.get(metadata['question_id'])
+                    if question_data:
+                        formatted_results.append({
+                            'question': question_data.get('question', ''),
+                            'options': question_data.get('options', []),
+                            'answer': question_data.get('answer', ''),
+                            'explanation': question_data.get('explanation', ''),
+                            'number': metadata['number'],
+                            'video_id': metadata['video_id'],
+                            'question_id': metadata['question_id'],
+                            'similarity': f"{similarity * 100:.1f}%"
+                        })
                 
-                if question_data:
-                    formatted_results.append({
-                        'question': question_data.get('question', ''),
-                        'options': question_data.get('options', []),
-                        'answer': question_data.get('answer', ''),
-                        'explanation': question_data.get('explanation', ''),
-                        'number': metadata['number'],
-                        'video_id': metadata['video_id'],
-                        'question_id': metadata['question_id'],
-                        'similarity': f"{similarity * 100:.1f}%"
-                    })
+                # Sort by similarity and limit to n_results
+                formatted_results.sort(key=lambda x: float(x['similarity'].rstrip('%')), reverse=True)
+                formatted_results = formatted_results[:n_results]
+                self._cache_search_results(cache_key, generation, formatted_results)
+                for position in misses[cache_key]:
+                    batch_results[position] = copy.deepcopy(formatted_results)
             
-            # Sort by similarity and limit to n_results
-            formatted_results.sort(key=lambda x: float(x['similarity'].rstrip('%')), reverse=True)
-            return formatted_results[:n_results]
+            return batch_results
             
         except Exception as e:
             print(f"Error searching questions: {str(e)}")
-            return []
+            return [result if result is not None else [] for result in batch_results]
     
     def index_questions_file(self, file_path: str, section_num: int) -> bool:
         """
         Parse and index questions from a JSON file.
         
+        Indexing is incremental: files whose content has not changed since the
+        last run are skipped, only new or edited questions are upserted, and
+        vectors for questions that were removed from the file are deleted.
+        
         Args:
             file_path (str): Path to the JSON file
             section_num (int): Section number for these questions
@@ -313,6 +629,23 @@ class QuestionVectorStore:
             bool: True if indexing was successful
         """
         try:
+            key = self._manifest_key(file_path)
+            entry = self.manifest['files'].get(key)
+            mtime = os.path.getmtime(file_path)
+            
+            # Cheap check first: same mtime means the file was not touched
+            if entry and entry['section_num'] == section_num and entry['mtime'] == mtime:
+                print(f"Skipping unchanged file {file_path}")
+                return True
+            
+            with open(file_path, 'rb') as f:
+                file_hash = hashlib.sha256(f.read()).hexdigest()
+            if entry and entry['section_num'] == section_num and entry['sha256'] == file_hash:
+                entry['mtime'] = mtime
+                self._save_manifest()
+                print(f"Skipping unchanged file {file_path}")
+                return True
+            
             # Extract video ID from filename
             video_id = os.path.basename(file_path).split('_')[0]  # Get first part before underscore
             
@@ -322,17 +655,178 @@ class QuestionVectorStore:
             # Save structured format to JSON
             self.save_questions_to_json(data['questions'], video_id, section_num)
             
-            # Add questions to vector database
-            if data['questions']:
-                return self.add_questions(section_num, data['questions'], video_id)
-            else:
+            # Work out which questions are new, edited or gone
+            question_hashes, changed_questions, removed_ids = self._diff_questions(
+                entry, data['questions'], video_id, section_num
+            )
+            
+            # One persist for the deletes and upserts together
+            with self._deferred_writes():
+                self.delete_questions(removed_ids)
+                success = True
+                if changed_questions:
+                    success = self.add_questions(section_num, changed_questions, video_id)
+                
+                if success:
+                    self.manifest['files'][key] = {
+                        'sha256': file_hash,
+                        'mtime': mtime,
+                        'section_num': section_num,
+                        'questions': question_hashes
+                    }
+                    self._save_manifest()
+            
+            if not data['questions']:
                 print(f"No questions found in {file_path}")
                 return False
+            print(f"Indexed {file_path}: {len(changed_questions)} upserted, {len(removed_ids)} removed")
+            return success
                 
         except Exception as e:
             print(f"Error indexing file {file_path}: {str(e)}")
             return False
     
+    def index_directory(self, directory: str, section_num: int) -> Dict:
+        """
+        Bring the vector database in line with the JSON files in a directory.
+        
+        Changed files are re-indexed incrementally and questions from files
+        that no longer exist are deleted.
+        
+        Args:
+            directory (str): Directory containing question JSON files
+            section_num (int): Section number for these questions
+            
+        Returns:
+            Dict: Counts of processed, failed and removed files
+        """
+        files = sorted(f for f in os.listdir(directory) if f.endswith('.json'))
+        print(f"Found {len(files)} JSON files to add to vector database: {files}")
+        
+        summary = {'processed': 0, 'failed': 0, 'removed': 0}
+        seen = set()
+        with self._deferred_writes():
+            for file in files:
+                file_path = os.path.join(directory, file)
+                seen.add(self._manifest_key(file_path))
+                if self.index_questions_file(file_path, section_num):
+                    summary['processed'] += 1
+                else:
+                    summary['failed'] += 1
+            
+            # Drop vectors for source files that have been deleted
+            summary['removed'] = self._remove_missing_files(directory, seen)
+        return summary
+    
+    def bulk_index(self, directory: str, section_num: int, workers: Optional[int] = None,
+                   batch_size: int = 256) -> Dict:
+        """
+        Index a large directory of question files in parallel.
+        
+        Files are parsed in a process pool and their new or edited questions are
+        streamed into fixed-size batches, each embedded and written with a single
+        upsert. Change detection and cleanup work as in index_directory.
+        
+        Args:
+            directory (str): Directory containing question JSON files
+            section_num (int): Section number for these questions
+            workers (Optional[int]): Number of parser processes (defaults to CPU count)
+            batch_size (int): Number of vector documents per upsert
+            
+        Returns:
+            Dict: Counts of processed, failed and removed files, and documents written
+        """
+        summary = {'processed': 0, 'failed': 0, 'removed': 0, 'documents': 0}
+        seen = set()
+        to_parse = []
+        for file in sorted(f for f in os.listdir(directory) if f.endswith('.json')):
+            file_path = os.path.join(directory, file)
+            key = self._manifest_key(file_path)
+            seen.add(key)
+            entry = self.manifest['files'].get(key)
+            if entry and entry['section_num'] == section_num and entry['mtime'] == os.path.getmtime(file_path):
+                summary['processed'] += 1
+            else:
+                to_parse.append(file_path)
+        print(f"Found {len(seen)} JSON files, {len(to_parse)} new or modified")
+        
+        ids, documents, metadatas = [], [], []
+        pending_entries = []  # (records queued so far, manifest key, entry) awaiting their batch
+        queued = 0
+        parsed = 0
+        start = time.perf_counter()
+        
+        def write_batches(final: bool = False):
+            # Write full batches; on the final call also write whatever is left over
+            while len(ids) >= batch_size or (final and ids):
+                n = min(batch_size, len(ids))
+                self._write_records(ids[:n], documents[:n], metadatas[:n])
+                del ids[:n], documents[:n], metadatas[:n]
+                summary['documents'] += n
+                rate = summary['documents'] / max(time.perf_counter() - start, 1e-9)
+                print(f"Progress: {parsed}/{len(to_parse)} files parsed, "
+                      f"{summary['documents']} documents written ({rate:.1f} docs/sec)")
+            
+            # A file only enters the manifest once all of its records are written
+            while pending_entries and pending_entries[0][0] <= summary['documents']:
+                _, key, entry = pending_entries.pop(0)
+                self.manifest['files'][key] = entry
+        
+        # Spawn rather than fork so workers don't inherit Chroma/ONNX runtime threads
+        context = multiprocessing.get_context("spawn")
+        try:
+            with self._deferred_writes():
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                    futures = [executor.submit(_parse_source_file, path) for path in to_parse]
+                    for future in as_completed(futures):
+                        result = future.result()
+                        parsed += 1
+                        if 'error' in result:
+                            print(f"Error indexing file {result['file_path']}: {result['error']}")
+                            summary['failed'] += 1
+                            continue
+                    
+                        file_path = result['file_path']
+                        key = self._manifest_key(file_path)
+                        entry = self.manifest['files'].get(key)
+                        if entry and entry['section_num'] == section_num and entry['sha256'] == result['sha256']:
+                            entry['mtime'] = result['mtime']
+                            summary['processed'] += 1
+                            continue
+                    
+                        video_id = os.path.basename(file_path).split('_')[0]
+                        questions = result['data']['questions']
+                        self.save_questions_to_json(questions, video_id, section_num)
+                    
+                        question_hashes, changed_questions, removed_ids = self._diff_questions(
+                            entry, questions, video_id, section_num
+                        )
+                        self.delete_questions(removed_ids)
+                    
+                        file_ids, file_documents, file_metadatas = self._build_records(
+                            section_num, changed_questions, video_id
+                        )
+                        ids.extend(file_ids)
+                        documents.extend(file_documents)
+                        metadatas.extend(file_metadatas)
+                        queued += len(file_ids)
+                        pending_entries.append((queued, key, {
+                            'sha256': result['sha256'],
+                            'mtime': result['mtime'],
+                            'section_num': section_num,
+                            'questions': question_hashes
+                        }))
+                        summary['processed' if questions else 'failed'] += 1
+                        
+                        write_batches()
+                write_batches(final=True)
+        finally:
+            # Persist progress even if a batch failed part way through the run
+            self._save_manifest()
+        
+        summary['removed'] = self._remove_missing_files(directory, seen)
+        return summary
+    
     def inspect_database(self) -> None:
         """Display the contents of the vector database"""
         try:
@@ -378,70 +872,173 @@ class QuestionVectorStore:
         except Exception as e:
             print(f"Error inspecting database: {str(e)}")
     
-    def get_all_questions(self) -> List[Dict]:
-        """Get all questions from the vector store"""
-        try:
-            # Get all entries from the collection
-            results = self.collection.get()
+    def migrate_to_compact(self, batch_size: int = 500) -> Dict:
+        """
+        Convert a legacy-layout collection to the compact layout in place.
+        
+        Answers and explanations are copied into the metadata of their question
+        entries (whose embeddings are kept as they are) and the separate answer
+        and explanation vectors are deleted, including any left behind by questions
+        rewritten in the compact layout. Already-compact questions are skipped,
+        so the migration can be re-run safely.
+        
+        This cuts the vector count to a third but does not shrink the files on
+        disk: Chroma keeps the space of deleted entries for reuse.
+        
+        Args:
+            batch_size (int): Questions converted per round trip
             
-            # Group by question_id to reconstruct full questions
-            questions = {}
-            for i, doc_id in enumerate(results['ids']):
-                metadata = results['metadatas'][i]
-                content = results['documents'][i]
-                
-                if metadata['type'] == 'question':
-                    question_id = metadata['question_id']
-                    if question_id not in questions:
-                        questions[question_id] = {
-                            'question': content,
-                            'options': [],
-                            'section_num': metadata.get('section_num', 1)
-                        }
-                elif metadata['type'] == 'answer':
-                    question_id = metadata['question_id']
-                    if question_id in questions:
-                        questions[question_id]['answer'] = content
-                elif metadata['type'] == 'explanation':
-                    question_id = metadata['question_id']
-                    if question_id in questions:
-                        questions[question_id]['explanation'] = content
-                
-            # Convert to list and ensure all required fields are present
-            complete_questions = []
-            for question_id, question_data in questions.items():
-                if all(key in question_data for key in ['question', 'options', 'answer', 'explanation']):
-                    question_data['id'] = question_id
-                    complete_questions.append(question_data)
+        Returns:
+            Dict: Questions migrated, plus vector counts and on-disk size before and after
+        """
+        def disk_usage() -> int:
+            return sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(self.vector_db_dir) for name in names
+            )
+        
+        summary = {
+            'vectors_before': self.collection.count(),
+            'bytes_before': disk_usage()
+        }
+        
+        # Collect first, then write, so updates cannot shift the pages being read
+        legacy = {}  # question ID -> metadata of its question entry
+        offset = 0
+        while True:
+            page = self.collection.get(where={"type": "question"}, limit=batch_size,
+                                       offset=offset, include=["metadatas"])
+            if not page['ids']:
+                break
+            legacy.update((m['question_id'], m) for m in page['metadatas'] if 'answer' not in m)
+            offset += len(page['ids'])
+        legacy_ids = list(legacy)
+        
+        with self._deferred_writes():
+            for start in range(0, len(legacy_ids), batch_size):
+                batch = legacy_ids[start:start + batch_size]
+                hydrated = self._hydrate_questions(batch)
+                self.collection.update(
+                    ids=[f"{qid}_q" for qid in hydrated],
+                    metadatas=[
+                        {**legacy[qid], 'answer': q['answer'], 'explanation': q['explanation']}
+                        for qid, q in hydrated.items()
+                    ]
+                )
+                self.collection.delete(ids=[f"{qid}_{suffix}" for qid in batch for suffix in ('a', 'e')])
+                print(f"Migrated {min(start + batch_size, len(legacy_ids))}/{len(legacy_ids)} questions")
+            # Leftovers from questions that were rewritten in the compact layout
+            self.collection.delete(where={"type": {"$in": ["answer", "explanation"]}})
+        self._invalidate_query_cache()
+        
+        summary['migrated'] = len(legacy_ids)
+        summary['vectors_after'] = self.collection.count()
+        summary['bytes_after'] = disk_usage()
+        return summary
+    
+    def iter_questions(self, offset: int = 0, limit: Optional[int] = None, page_size: int = 500) -> Iterator[Dict]:
+        """
+        Stream stored questions page by page.
+        
+        Each page fetches only the metadata of question entries and then hydrates
+        that page's questions by key, so memory use depends on the page size
+        rather than on the size of the collection.
+        
+        Args:
+            offset (int): Number of questions to skip
+            limit (Optional[int]): Maximum number of questions to return (all if None)
+            page_size (int): Questions fetched per round trip
             
-            return complete_questions
+        Yields:
+            Dict: Question with id, question, options, answer, explanation and section_num
+        """
+        fetched = 0
+        while limit is None or fetched < limit:
+            size = page_size if limit is None else min(page_size, limit - fetched)
+            page = self.collection.get(
+                where={"type": "question"},
+                limit=size,
+                offset=offset + fetched,
+                include=["metadatas"]
+            )
+            if not page['ids']:
+                return
+            
+            question_ids = [metadata['question_id'] for metadata in page['metadatas']]
+            hydrated = self._hydrate_questions(question_ids)
+            for question_id in question_ids:
+                question_data = hydrated.get(question_id)
+                if question_data:
+                    yield {
+                        'id': question_id,
+                        'question': question_data['question'],
+                        'options': question_data['options'],
+                        'answer': question_data['answer'],
+                        'explanation': question_data['explanation'],
+                        'section_num': question_data['section_num']
+                    }
+            
+            fetched += len(page['ids'])
+            if len(page['ids']) < size:
+                return
+    
+    def get_all_questions(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+        """Get questions from the vector store, optionally one page at a time"""
+        try:
+            return list(self.iter_questions(offset=offset, limit=limit))
             
         except Exception as e:
             print(f"Error getting questions from vector store: {str(e)}")
             return []
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Index structured question files into the vector database")
+    parser.add_argument("--bulk", action="store_true",
+                        help="Parse files in a process pool and write batched upserts (for large corpora)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of parser processes in bulk mode (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="Vector documents per upsert in bulk mode (default: 256)")
+    parser.add_argument("--migrate-compact", action="store_true",
+                        help="Convert the existing collection to the compact one-vector-per-question layout and exit")
+    args = parser.parse_args()
+    
     # Initialize the vector database
     store = QuestionVectorStore()
     
+    if args.migrate_compact:
+        start = time.perf_counter()
+        result = store.migrate_to_compact()
+        print(f"\nMigrated {result['migrated']} questions in {time.perf_counter() - start:.1f}s")
+        print(f"Vectors: {result['vectors_before']} -> {result['vectors_after']}")
+        print(f"On-disk size: {result['bytes_before'] / 1e6:.1f} MB -> {result['bytes_after'] / 1e6:.1f} MB "
+              "(Chroma keeps the space of deleted vectors for reuse, so files do not shrink)")
+        print("Set VECTOR_LAYOUT=compact so future indexing keeps the compact layout")
+        exit(0)
+    
     # Process all JSON files and add them to the vector database
     structured_data_dir = os.path.join(store.data_dir, "structured_data")
     if not os.path.exists(structured_data_dir):
         print(f"Error: Structured data directory {structured_data_dir} does not exist")
         exit(1)
     
-    # Find JSON files to process
-    files = [f for f in os.listdir(structured_data_dir) if f.endswith('.json')]
-    print(f"Found {len(files)} JSON files to add to vector database: {files}")
-    
-    # Add files to vector database
-    processed = 0
-    for file in files:
-        file_path = os.path.join(structured_data_dir, file)
-        if store.index_questions_file(file_path, 1):
-            processed += 1
+    # Index new and changed files, and drop questions from deleted ones
+    if args.bulk:
+        start = time.perf_counter()
+        summary = store.bulk_index(structured_data_dir, 1, workers=args.workers, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"\nBulk ingestion wrote {summary['documents']} documents in {elapsed:.1f}s "
+              f"({summary['documents'] / max(elapsed, 1e-9):.1f} docs/sec)")
+    else:
+        summary = store.index_directory(structured_data_dir, 1)
+    print(f"\nSuccessfully indexed {summary['processed']} files "
+          f"({summary['failed']} failed, {summary['removed']} removed)")
     
-    print(f"\nSuccessfully added {processed} files to vector database")
+    cache_stats = store.embedding_cache.stats()
+    print(f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+          f"({cache_stats['hit_ratio'] * 100:.1f}% reused)")
     
     # Display database contents
     store.inspect_database()
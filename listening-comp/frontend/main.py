@@ -21,6 +21,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Practice questions fetched from the backend per request
+PRACTICE_PAGE_SIZE = 10
+
 # Initialize session state
 if 'transcript' not in st.session_state:
     st.session_state.transcript = None
@@ -252,6 +255,42 @@ def render_structured_stage():
         # Placeholder for structured data view
         st.info("Structured data view will be implemented here")
 
+def iter_sse_events(response):
+    """Yield (event, data) pairs from a server-sent events response"""
+    event, data_lines = "message", []
+    # chunk_size=None yields data as it arrives; the default 512-byte reads hold events back
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if not line:
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+def get_json_cached(url: str, params: Dict = None):
+    """
+    GET a JSON endpoint, revalidating with the ETag of the last response.
+    
+    Streamlit reruns the script on every click, so the body of each URL is kept
+    in session state and reused when the backend answers 304 Not Modified.
+    Returns None if the request fails.
+    """
+    cache = st.session_state.setdefault("etag_cache", {})
+    key = (url, tuple(sorted((params or {}).items())))
+    cached = cache.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    response = requests.get(url, params=params, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached[1]
+    if response.status_code != 200:
+        return None
+    data = response.json()
+    if response.headers.get("ETag"):
+        cache[key] = (response.headers["ETag"], data)
+    return data
+
 def render_rag_stage():
     """Render the RAG implementation stage"""
     st.header("Question Generation with RAG")
@@ -267,44 +306,66 @@ def render_rag_stage():
     
     # Generate button
     if topic and st.button("Generate Question", type="primary"):
+        st.session_state.pop("rag_question", None)
+        # Generating again for the same topic and section asks for a new question
+        # instead of the cached response from the previous click
+        request_key = (topic, section_num)
+        regenerate = st.session_state.get("rag_request") == request_key
+        st.session_state["rag_request"] = request_key
+        question_placeholder = st.empty()
+        options_placeholder = st.empty()
         with st.spinner("Generating question..."):
             try:
-                # Make API call to our backend
+                # Stream the question from the backend, showing each part as it arrives
                 response = requests.post(
-                    "http://localhost:8000/api/generate-question",
-                    json={"topic": topic, "section_num": section_num}
+                    "http://localhost:8000/api/generate-question/stream",
+                    json={"topic": topic, "section_num": section_num, "bypass_cache": regenerate},
+                    stream=True
                 )
                 
                 if response.status_code == 200:
-                    question_data = response.json()
-                    
-                    # Display the generated question
-                    st.subheader("Generated Question")
-                    st.write(question_data["question"])
-                    
-                    # Display options
-                    st.subheader("Options")
-                    selected_option = st.radio(
-                        "Choose your answer:",
-                        question_data["options"],
-                        key="question_options"
-                    )
-                    
-                    # Check answer button
-                    if st.button("Check Answer"):
-                        if selected_option == question_data["answer"]:
-                            st.success("Correct! 🎉")
-                        else:
-                            st.error("Not quite right. Try again!")
-                        
-                        # Show explanation
-                        st.info(f"Explanation: {question_data['explanation']}")
+                    for event, data in iter_sse_events(response):
+                        if event in ("partial", "field") and data["field"] == "question":
+                            question_placeholder.markdown(f"#### Generated Question\n{data['value']}")
+                        elif event == "field" and data["field"] == "options":
+                            options_placeholder.markdown("\n".join(f"- {option}" for option in data["value"]))
+                        elif event == "complete":
+                            st.session_state["rag_question"] = data
+                        elif event == "error":
+                            st.error(f"Error: {data.get('detail', 'Failed to generate question')}")
+                    question_placeholder.empty()
+                    options_placeholder.empty()
                 else:
                     st.error(f"Error: {response.json().get('detail', 'Failed to generate question')}")
                     
             except Exception as e:
                 st.error(f"Error connecting to backend: {str(e)}")
     
+    # Keep showing the last generated question so the answer can be checked
+    question_data = st.session_state.get("rag_question")
+    if question_data:
+        # Display the generated question
+        st.subheader("Generated Question")
+        st.write(question_data["question"])
+        
+        # Display options
+        st.subheader("Options")
+        selected_option = st.radio(
+            "Choose your answer:",
+            question_data["options"],
+            key="question_options"
+        )
+        
+        # Check answer button
+        if st.button("Check Answer"):
+            if selected_option == question_data["answer"]:
+                st.success("Correct! 🎉")
+            else:
+                st.error("Not quite right. Try again!")
+            
+            # Show explanation
+            st.info(f"Explanation: {question_data['explanation']}")
+    
     # Add some example topics
     with st.sidebar:
         st.markdown("### Example Topics")
@@ -349,15 +410,22 @@ def render_interactive_stage():
         # Fetch questions from backend
         try:
             # Only fetch from practice-questions endpoint which includes fallback questions
-            response = requests.get("http://backend:8000/api/practice-questions")
+            count = get_json_cached("http://backend:8000/api/practice-questions/count")
+            total_questions = count["count"] if count else 0
             
-            all_questions = []
-            if response.status_code == 200:
-                all_questions = response.json()
+            # Fetch only the page holding the current question
+            page = []
+            if total_questions:
+                st.session_state.question_index = min(st.session_state.question_index, total_questions - 1)
+                page_offset = st.session_state.question_index - st.session_state.question_index % PRACTICE_PAGE_SIZE
+                page = get_json_cached(
+                    "http://backend:8000/api/practice-questions",
+                    {"offset": page_offset, "limit": PRACTICE_PAGE_SIZE}
+                ) or []
             
-            if all_questions:
+            if page:
                 # Get current question
-                current_question = all_questions[st.session_state.question_index]
+                current_question = page[min(st.session_state.question_index - page_offset, len(page) - 1)]
                 
                 # Display question
                 st.subheader("Practice Question")
@@ -427,10 +495,10 @@ def render_interactive_stage():
                         st.rerun()
                 
                 with col2:
-                    st.write(f"Question {st.session_state.question_index + 1} of {len(all_questions)}")
+                    st.write(f"Question {st.session_state.question_index + 1} of {total_questions}")
                 
                 with col3:
-                    if st.button("Next ➡️") and st.session_state.question_index < len(all_questions) - 1:
+                    if st.button("Next ➡️") and st.session_state.question_index < total_questions - 1:
                         st.session_state.question_index += 1
                         st.rerun()
                 